@@ -1,19 +1,37 @@
+import time
+
+# Cold start is measured from the moment this module starts importing
+_import_started = time.perf_counter()
+
 import os
 import sys
 import random
 import json
 import datetime
-from flask import Flask, request, render_template, send_from_directory, jsonify, session
+import threading
+from flask import Flask, request, render_template, send_from_directory, send_file, jsonify, session, abort, redirect, url_for
+from werkzeug.security import safe_join
 from pathlib import Path
 from urllib.parse import urlparse
 
 # Import app modules
-from spotify_client import initialize_spotify
+from spotify_client import (
+    initialize_spotify, get_pool_stats, get_spotify_status, validate_spotify_credentials,
+    revalidate_spotify_if_failed, extract_playlists_data
+)
 from generator import generate_cover
+from jobs import get_job_queue, QueueFullError, QUEUED, DONE, FAILED
+from single_flight import get_single_flight
+from title_generator import get_title_stats
 from chart_generator import generate_genre_chart
+from image_derivatives import DERIVATIVE_FORMATS, DERIVATIVE_MIMETYPES, choose_format, get_derivative, file_etag
 from models import PlaylistData, GenreAnalysis, LoraModel
 from utils import generate_random_string, get_available_loras, add_lora_link, extract_lora_id_from_civitai, get_lora_details_from_civitai
-from config import BASE_DIR, COVERS_DIR, FLASK_SECRET_KEY, CIVITAI_API_ENABLED
+from config import (
+    BASE_DIR, COVERS_DIR, FLASK_SECRET_KEY, CIVITAI_API_ENABLED,
+    STARTUP_MODE, COLD_START_TARGET_SECONDS, MAX_BATCH_URLS, COVER_DERIVATIVE_SIZES, COVER_CACHE_MAX_AGE,
+    ensure_directories
+)
 
 # Initialize Flask app
 app = Flask(__name__, template_folder=str(BASE_DIR / "templates"), static_folder=str(BASE_DIR / "static"))
@@ -22,57 +40,165 @@ app.secret_key = FLASK_SECRET_KEY or generate_random_string(24)
 # Global initialization flag
 initialized = False
 
+# Background initialization state
+_init_lock = threading.Lock()
+_init_started = False
+ready_seconds = None  # Time from import until credentials were validated
+
+def get_missing_credentials():
+    """List the API credentials missing from the environment"""
+    from config import SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, GEMINI_API_KEY, STABILITY_API_KEY, IMAGE_BACKEND
+    missing = []
+    if not SPOTIFY_CLIENT_ID or not SPOTIFY_CLIENT_SECRET:
+        missing.append("Spotify API credentials")
+    if not GEMINI_API_KEY:
+        missing.append("Gemini API key")
+    # The local and fake image backends need no key
+    if IMAGE_BACKEND == "stability" and not STABILITY_API_KEY:
+        missing.append("Stable Diffusion API key")
+    return missing
+
 def initialize_app():
     """Initialize the application's dependencies"""
-    global initialized
+    global initialized, ready_seconds, _init_started
     
-    # Initialize Spotify client
-    spotify_initialized = initialize_spotify()
+    # Also set when called directly (eager start, CLI), so before_request does not run it again
+    with _init_lock:
+        _init_started = True
     
-    # Check all required environment variables
-    from config import SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, GEMINI_API_KEY, STABILITY_API_KEY
-    env_vars_present = all([
-        SPOTIFY_CLIENT_ID, 
-        SPOTIFY_CLIENT_SECRET, 
-        GEMINI_API_KEY, 
-        STABILITY_API_KEY
-    ])
+    ensure_directories()
     
-    if not env_vars_present:
-        missing = []
-        if not SPOTIFY_CLIENT_ID or not SPOTIFY_CLIENT_SECRET:
-            missing.append("Spotify API credentials")
-        if not GEMINI_API_KEY:
-            missing.append("Gemini API key")
-        if not STABILITY_API_KEY:
-            missing.append("Stable Diffusion API key")
+    # Initialize Spotify client: eager mode runs the live probe, lazy mode only checks the token
+    if STARTUP_MODE == "eager":
+        spotify_initialized = initialize_spotify()
+    else:
+        spotify_initialized = validate_spotify_credentials()
+    
+    # Check all required environment variables
+    missing = get_missing_credentials()
+    if missing:
         print(f"⚠️ Missing environment variables: {', '.join(missing)}")
     
-    initialized = spotify_initialized and env_vars_present
+    initialized = spotify_initialized and not missing
+    ready_seconds = time.perf_counter() - _import_started
     return initialized
 
-def calculate_genre_percentages(genres_list):
-    """Calculate percentage distribution of genres"""
-    if not genres_list:
+def start_initialization():
+    """Run initialize_app once on a background thread so no request waits on it"""
+    global _init_started
+    with _init_lock:
+        if _init_started:
+            return
+        _init_started = True
+    
+    threading.Thread(target=initialize_app, name="app-initialization", daemon=True).start()
+
+@app.before_request
+def ensure_initialization_started():
+    """Kick off background initialization on the first request of a worker, and
+    check the Spotify credentials again a while after a failed check"""
+    if not _init_started:
+        start_initialization()
+    else:
+        revalidate_spotify_if_failed()
+
+def calculate_genre_percentages(genre_counts):
+    """Calculate percentage distribution of genres from a genre -> count mapping"""
+    if not genre_counts:
         return []
     
     # Use GenreAnalysis to calculate percentages
-    genre_analysis = GenreAnalysis.from_genre_list(genres_list)
+    genre_analysis = GenreAnalysis(genre_counts=GenreAnalysis.rank_counts(genre_counts))
     return genre_analysis.get_percentages(max_genres=5)
 
+def build_generate_response(result):
+    """API response body for a finished generation"""
+    response = {
+        "success": True,
+        "title": result["title"],
+        "image_path": result["output_path"],
+        "image_url": f"/generated_covers/{os.path.basename(result['output_path'])}",
+        "data_file": result.get("data_file"),
+        "genres": result.get("genres", []),
+        "mood": result.get("mood", ""),
+        "energy_level": result.get("energy_level", ""),
+        "playlist_name": result.get("item_name", ""),
+        "lora_name": result.get("lora_name", ""),
+        "lora_type": result.get("lora_type", ""),
+        "lora_url": result.get("lora_url", "")
+    }
+    if result.get("variants"):
+        response["variants"] = [
+            {
+                "seed": variant["seed"],
+                "image_path": variant["output_path"],
+                "image_url": f"/generated_covers/{os.path.basename(variant['output_path'])}"
+            }
+            for variant in result["variants"]
+        ]
+    if result.get("contact_sheet"):
+        response["contact_sheet_url"] = f"/generated_covers/{os.path.basename(result['contact_sheet'])}"
+    return response
+
+def render_generation_result(result, playlist_url, user_mood):
+    """Render the result page for a finished generation"""
+    # Get the filename part from the full path
+    img_filename = os.path.basename(result["output_path"])
+    
+    # Genre chart, drawn by the pipeline while the image was generated
+    genres_chart = result.get("genres_chart")
+    if genres_chart is None:
+        genres_chart = generate_genre_chart(result.get("genre_counts", {}))
+    
+    # Genre percentages for visualization, computed once by the analysis
+    genre_percentages = result.get("genre_percentages")
+    if genre_percentages is None:
+        genre_percentages = calculate_genre_percentages(result.get("genre_counts", {}))
+    
+    # Data for display
+    display_data = {
+        "title": result["title"],
+        "image_file": img_filename,
+        # Shown size of the cover: "medium" if configured, else the largest preview (None: the original)
+        "preview_size": "medium" if "medium" in COVER_DERIVATIVE_SIZES else max(
+            COVER_DERIVATIVE_SIZES, key=COVER_DERIVATIVE_SIZES.get, default=None
+        ),
+        "genres": ", ".join(result.get("genres", [])),
+        "mood": result.get("mood", ""),
+        "energy": result.get("energy_level", ""),
+        "playlist_name": result.get("item_name", "Your Music"),
+        "found_genres": bool(result.get("genres", [])),
+        "genres_chart": genres_chart,
+        "genre_percentages": genre_percentages,
+        "playlist_url": playlist_url,
+        "user_mood": user_mood,
+        "lora_name": result.get("lora_name", ""),
+        "lora_type": result.get("lora_type", ""),
+        "lora_url": result.get("lora_url", "")
+    }
+    
+    return render_template("result.html", **display_data)
+
+def submit_generation_job(params):
+    """Queue a generation and answer with the job ID to poll, without waiting for it"""
+    try:
+        job_id = get_job_queue().submit("generate", params)
+    except QueueFullError as e:
+        response = jsonify({"error": str(e)})
+        response.headers["Retry-After"] = "30"
+        return response, 503
+    
+    return jsonify({
+        "success": True,
+        "job_id": job_id,
+        "status": QUEUED,
+        "status_url": f"/api/jobs/{job_id}"
+    }), 202
+
 # Routes
 @app.route("/", methods=["GET", "POST"])
 def index():
     """Main route for the application"""
-    global initialized
-    
-    # Ensure app is initialized
-    if not initialized:
-        if initialize_app():
-            print("Application initialized successfully")
-        else:
-            print("Failed to initialize application")
-    
     # Get available LoRAs
     loras = get_available_loras()
     
@@ -104,45 +230,21 @@ def index():
                     loras=loras
                 )
             
-            # Generate cover
-            result = generate_cover(playlist_url, user_mood, lora_input)
-            
-            # Handle errors
-            if "error" in result:
+            # Generate the cover on a job worker and send the browser to its status page
+            try:
+                job_id = get_job_queue().submit("generate", {
+                    "url": playlist_url,
+                    "user_mood": user_mood,
+                    "lora_input": lora_input.name if isinstance(lora_input, LoraModel) else lora_input
+                })
+            except QueueFullError:
                 return render_template(
                     "index.html", 
-                    error=result["error"],
+                    error="The generator is busy right now. Please try again in a minute.",
                     loras=loras
                 )
             
-            # Get the filename part from the full path
-            img_filename = os.path.basename(result["output_path"])
-            
-            # Generate genre chart
-            genres_chart = generate_genre_chart(result.get("all_genres", []))
-            
-            # Calculate genre percentages for visualization
-            genre_percentages = calculate_genre_percentages(result.get("all_genres", []))
-            
-            # Data for display
-            display_data = {
-                "title": result["title"],
-                "image_file": img_filename,
-                "genres": ", ".join(result.get("genres", [])),
-                "mood": result.get("mood", ""),
-                "energy": result.get("energy_level", ""),
-                "playlist_name": result.get("item_name", "Your Music"),
-                "found_genres": bool(result.get("genres", [])),
-                "genres_chart": genres_chart,
-                "genre_percentages": genre_percentages,
-                "playlist_url": playlist_url,
-                "user_mood": user_mood,
-                "lora_name": result.get("lora_name", ""),
-                "lora_type": result.get("lora_type", ""),
-                "lora_url": result.get("lora_url", "")
-            }
-            
-            return render_template("result.html", **display_data)
+            return redirect(url_for("job_page", job_id=job_id), code=303)
         except Exception as e:
             print(f"Server error processing request: {e}")
             return render_template(
@@ -155,22 +257,76 @@ def index():
 
 @app.route("/generated_covers/<path:filename>")
 def serve_image(filename):
-    """Serve generated images"""
-    return send_from_directory(COVERS_DIR, filename)
+    """Serve generated images
+
+    ?size= picks a smaller version (see COVER_DERIVATIVE_SIZES) and ?format=
+    picks png or webp; without it, WebP is sent to clients that accept it.
+    Covers never change, so responses carry a content ETag and are cached
+    as immutable.
+    """
+    size = request.args.get("size") or None
+    if size is not None and size not in COVER_DERIVATIVE_SIZES:
+        return jsonify({"error": f"Unknown size '{size}', expected one of: {', '.join(COVER_DERIVATIVE_SIZES)}"}), 400
+    
+    requested_format = request.args.get("format")
+    if requested_format and requested_format.lower() not in DERIVATIVE_FORMATS:
+        return jsonify({"error": f"Unknown format '{requested_format}', expected one of: {', '.join(DERIVATIVE_FORMATS)}"}), 400
+    
+    source_path = safe_join(str(COVERS_DIR), filename)
+    if source_path is None or not os.path.isfile(source_path):
+        abort(404)
+    
+    image_format = choose_format(requested_format, request.headers.get("Accept", ""))
+    path = get_derivative(source_path, size, image_format)
+    
+    response = send_file(
+        path,
+        mimetype=DERIVATIVE_MIMETYPES[image_format],
+        etag=file_etag(path),
+        max_age=COVER_CACHE_MAX_AGE,
+        conditional=True
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    if not requested_format:
+        # The format depended on the Accept header
+        response.vary.add("Accept")
+    return response
 
 @app.route("/status")
 def status():
     """API endpoint to check system status"""
     # Check if Spotify is initialized
-    from spotify_client import sp
+    pool_stats = get_pool_stats()
     
     return jsonify({
         "initialized": initialized,
-        "spotify_working": sp is not None,
+        "spotify_working": pool_stats is not None,
+        "spotify_pool": pool_stats,
+        "jobs": get_job_queue().stats(),
+        "coalescing": get_single_flight().stats(),
+        "titles": get_title_stats(),
         "loras_available": len(get_available_loras()),
         "civitai_api_enabled": CIVITAI_API_ENABLED
     })
 
+@app.route("/ready")
+def ready():
+    """Readiness endpoint: 200 once credentials are validated, 503 until then"""
+    spotify = get_spotify_status()
+    missing = get_missing_credentials()
+    is_ready = spotify["state"] == "ready" and not missing
+    
+    return jsonify({
+        "ready": is_ready,
+        "startup_mode": STARTUP_MODE,
+        "spotify": spotify,
+        "missing_credentials": missing,
+        "cold_start_seconds": round(cold_start_seconds, 3),
+        "cold_start_target_seconds": COLD_START_TARGET_SECONDS,
+        "ready_seconds": round(ready_seconds, 3) if ready_seconds is not None else None
+    }), 200 if is_ready else 503
+
 @app.route("/api/generate", methods=["POST"])
 def api_generate():
     """API endpoint to generate covers programmatically"""
@@ -203,27 +359,32 @@ def api_generate():
             # Use URL directly
             lora_input = lora_url
         
+        # Optional fixed seed for reproducible (and cacheable) images
+        seed = data.get("seed")
+        if seed is not None:
+            try:
+                seed = int(seed)
+            except (TypeError, ValueError):
+                return jsonify({"error": "seed must be an integer"}), 400
+        
+        # Queue the generation instead of holding the connection open
+        # (clients that want to wait for the cover pass "async": false)
+        if data.get("async", True):
+            return submit_generation_job({
+                "url": spotify_url,
+                "user_mood": user_mood,
+                "lora_input": lora_name or lora_url or None,
+                "seed": seed
+            })
+        
         # Generate the cover
-        result = generate_cover(spotify_url, user_mood, lora_input)
+        result = generate_cover(spotify_url, user_mood, lora_input, seed=seed)
         
         if "error" in result:
             return jsonify({"error": result["error"]}), 400
             
         # Return result data
-        return jsonify({
-            "success": True,
-            "title": result["title"],
-            "image_path": result["output_path"],
-            "image_url": f"/generated_covers/{os.path.basename(result['output_path'])}",
-            "data_file": result.get("data_file"),
-            "genres": result.get("genres", []),
-            "mood": result.get("mood", ""),
-            "energy_level": result.get("energy_level", ""),
-            "playlist_name": result.get("item_name", ""),
-            "lora_name": result.get("lora_name", ""),
-            "lora_type": result.get("lora_type", ""),
-            "lora_url": result.get("lora_url", "")
-        })
+        return jsonify(build_generate_response(result))
     except Exception as e:
         print(f"API error: {e}")
         return jsonify({"error": str(e)}), 500
@@ -260,25 +421,100 @@ def api_regenerate():
             # Use URL directly
             lora_input = lora_url
         
+        # Number of seeds to generate side by side (1 = a single new cover)
+        try:
+            variants = int(data.get("variants", 1))
+        except (TypeError, ValueError):
+            return jsonify({"error": "variants must be an integer"}), 400
+        contact_sheet = bool(data.get("contact_sheet", False))
+        
         # Generate a new seed to ensure variation
         random_seed = random.randint(1, 1000000)
         
+        # Queue the generation instead of holding the connection open
+        # (clients that want to wait for the cover pass "async": false)
+        if data.get("async", True):
+            return submit_generation_job({
+                "url": spotify_url,
+                "user_mood": user_mood,
+                "lora_input": lora_name or lora_url or None,
+                "seed": random_seed,
+                "variants": variants,
+                "contact_sheet": contact_sheet
+            })
+        
         # Generate the cover
-        result = generate_cover(spotify_url, user_mood, lora_input)
+        result = generate_cover(
+            spotify_url, user_mood, lora_input, seed=random_seed, variants=variants, contact_sheet=contact_sheet
+        )
         
         if "error" in result:
             return jsonify({"error": result["error"]}), 400
             
         # Return result data
+        return jsonify(build_generate_response(result))
+    except Exception as e:
+        print(f"API error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/jobs/<job_id>")
+def api_job_status(job_id):
+    """API endpoint to follow a queued generation"""
+    job = get_job_queue().store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    
+    response = {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"]
+    }
+    if "queue_position" in job:
+        response["queue_position"] = job["queue_position"]
+    if job["status"] == DONE:
+        response["result"] = build_generate_response(job["result"])
+    elif job["status"] == FAILED:
+        response["error"] = job["error"]
+    return jsonify(response)
+
+@app.route("/jobs/<job_id>")
+def job_page(job_id):
+    """Page shown while a generation submitted from the form is running"""
+    job = get_job_queue().store.get(job_id)
+    if job is None:
+        abort(404)
+    
+    if job["status"] == DONE:
+        params = job["params"]
+        return render_generation_result(job["result"], params["url"], params.get("user_mood", ""))
+    if job["status"] == FAILED:
+        return render_template("index.html", error=job["error"], loras=get_available_loras())
+    return render_template("job.html", job=job)
+
+@app.route("/api/analyze_batch", methods=["POST"])
+def api_analyze_batch():
+    """API endpoint to analyze many playlists/albums, sharing artist lookups across them"""
+    try:
+        data = request.json
+        if not data or not isinstance(data.get("urls"), list) or not data["urls"]:
+            return jsonify({"error": "Missing urls list in request"}), 400
+        
+        urls = [str(url).strip() for url in data["urls"]]
+        if len(urls) > MAX_BATCH_URLS:
+            return jsonify({"error": f"At most {MAX_BATCH_URLS} URLs per batch"}), 400
+        
+        results = []
+        for url, playlist_data in zip(urls, extract_playlists_data(urls)):
+            if isinstance(playlist_data, dict) and "error" in playlist_data:
+                results.append({"url": url, "error": playlist_data["error"]})
+            else:
+                results.append({"url": url, "playlist_data": playlist_data.to_dict()})
+        
         return jsonify({
             "success": True,
-            "title": result["title"],
-            "image_path": result["output_path"],
-            "image_url": f"/generated_covers/{os.path.basename(result['output_path'])}",
-            "data_file": result.get("data_file", ""),
-            "lora_name": result.get("lora_name", ""),
-            "lora_type": result.get("lora_type", ""),
-            "lora_url": result.get("lora_url", "")
+            "results": results
         })
     except Exception as e:
         print(f"API error: {e}")
@@ -313,6 +549,7 @@ def api_upload_lora():
             
         # Save the file
         from config import LORA_DIR
+        ensure_directories()
         filename = os.path.basename(file.filename)
         file.save(os.path.join(LORA_DIR, filename))
         
@@ -375,6 +612,16 @@ def api_add_lora_link():
         print(f"API error: {e}")
         return jsonify({"error": str(e)}), 500
 
+# Time from the start of the import until the app could take traffic
+cold_start_seconds = time.perf_counter() - _import_started
+if cold_start_seconds > COLD_START_TARGET_SECONDS:
+    print(f"⚠️ Cold start took {cold_start_seconds:.2f}s (target {COLD_START_TARGET_SECONDS:.2f}s)")
+
+# WSGI servers import this module without running __main__, so lazy workers
+# start validating at boot instead of on their first request
+if STARTUP_MODE == "lazy" and __name__ != "__main__":
+    start_initialization()
+
 if __name__ == "__main__":
     import sys
     
@@ -437,5 +684,8 @@ if __name__ == "__main__":
     # Default to web server mode
     print(f"Starting Spotify Cover Generator")
     
-    initialize_app()
+    if STARTUP_MODE == "eager":
+        initialize_app()
+    else:
+        start_initialization()
     app.run(debug=False, host="0.0.0.0", port=50)
\ No newline at end of file
@@ -0,0 +1,100 @@
+import json
+import sqlite3
+import time
+from pathlib import Path
+from config import ARTIST_CACHE_PATH, ARTIST_CACHE_TTL
+
+# SQLite limits the number of bound parameters per statement
+MAX_QUERY_PARAMS = 500
+
+class ArtistGenreCache:
+    """Persistent artist ID -> genres cache shared by all workers through SQLite"""
+
+    def __init__(self, path=ARTIST_CACHE_PATH, ttl=ARTIST_CACHE_TTL):
+        self.path = str(path)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self._create_table()
+
+    def _connect(self):
+        """Open a new connection (connections are not shared between threads)"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _create_table(self):
+        """Create the cache table if it does not exist yet"""
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS artist_genres ("
+                "artist_id TEXT PRIMARY KEY, genres TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+        conn.close()
+
+    def get_many(self, artist_ids):
+        """Look up many artists at once, returning {artist_id: genres} for fresh hits only"""
+        artist_ids = list(artist_ids)
+        found = {}
+        cutoff = time.time() - self.ttl
+
+        conn = self._connect()
+        try:
+            for i in range(0, len(artist_ids), MAX_QUERY_PARAMS):
+                chunk = artist_ids[i:i+MAX_QUERY_PARAMS]
+                placeholders = ",".join("?" for _ in chunk)
+                rows = conn.execute(
+                    f"SELECT artist_id, genres FROM artist_genres "
+                    f"WHERE artist_id IN ({placeholders}) AND updated_at >= ?",
+                    (*chunk, cutoff)
+                )
+                for artist_id, genres in rows:
+                    found[artist_id] = json.loads(genres)
+        finally:
+            conn.close()
+
+        return found
+
+    def set_many(self, artist_genres):
+        """Store genres for many artists at once"""
+        if not artist_genres:
+            return
+
+        now = time.time()
+        rows = [(artist_id, json.dumps(genres), now) for artist_id, genres in artist_genres.items()]
+
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO artist_genres (artist_id, genres, updated_at) VALUES (?, ?, ?)",
+                    rows
+                )
+        finally:
+            conn.close()
+
+    def purge_expired(self):
+        """Delete entries older than the TTL, returning the number removed"""
+        conn = self._connect()
+        try:
+            with conn:
+                cursor = conn.execute(
+                    "DELETE FROM artist_genres WHERE updated_at < ?",
+                    (time.time() - self.ttl,)
+                )
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+# Shared cache instance, created on first use
+_artist_cache = None
+
+def get_artist_cache():
+    """Get the shared artist genre cache, dropping expired entries when it is created"""
+    global _artist_cache
+    if _artist_cache is None:
+        cache = ArtistGenreCache()
+        removed = cache.purge_expired()
+        if removed:
+            print(f"Removed {removed} expired artist cache entries")
+        _artist_cache = cache
+    return _artist_cache
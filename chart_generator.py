@@ -1,25 +1,50 @@
-import matplotlib.pyplot as plt
-import matplotlib
 import io
 import base64
+import threading
 from collections import Counter
-matplotlib.use('Agg')  # Use non-interactive backend
+
+# pyplot keeps global state, so charts drawn from several threads take turns
+_chart_lock = threading.Lock()
+
+def _get_pyplot():
+    """Import matplotlib on first use; it is slow to import and only needed for charts"""
+    import matplotlib
+    matplotlib.use('Agg')  # Use non-interactive backend
+    import matplotlib.pyplot as plt
+    return plt
 
 def generate_genre_chart(genres):
-    """Generate a bar chart visualization of genres"""
+    """Generate a bar chart visualization of genres
+
+    genres can be a GenreAnalysis (its cached chart data is used), a
+    genre -> count mapping or a plain list of genres.
+    """
     if not genres:
         return None
     
-    # Count genre frequencies if it's a list
-    if isinstance(genres, list):
-        # Count genres by frequency using Counter
-        genre_counter = Counter(genres)
-        genres_sorted = genre_counter.most_common(8)  # Get top 8 genres
+    if hasattr(genres, "get_chart_data"):
+        labels, values = genres.get_chart_data(max_genres=8)
+    else:
+        if isinstance(genres, list):
+            # Count genres by frequency using Counter
+            genres = Counter(genres)
+        elif not isinstance(genres, dict):
+            return None
+        
+        # Get top 8 genres
+        genres_sorted = sorted(genres.items(), key=lambda x: (-x[1], x[0]))[:8]
         labels = [genre for genre, _ in genres_sorted]
         values = [count for _, count in genres_sorted]
-    else:
+    
+    if not labels:
         return None
     
+    plt = _get_pyplot()
+    with _chart_lock:
+        return _draw_chart(plt, labels, values)
+
+def _draw_chart(plt, labels, values):
+    """Render the bar chart as a base64 PNG data URI"""
     # Create bar chart with improved styling
     fig = plt.figure(figsize=(12, 8), dpi=100)
     ax = fig.add_subplot(111)
@@ -2,40 +2,183 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
-
 # Base paths
 BASE_DIR = Path(os.path.dirname(os.path.abspath(__file__)))
+
+# Load environment variables from the project's .env (explicit path avoids a directory search)
+load_dotenv(BASE_DIR / ".env")
+
 COVERS_DIR = BASE_DIR / "generated_covers"
 DATA_DIR = BASE_DIR / "data"
 LORA_DIR = BASE_DIR / "loras"
+CACHE_DIR = BASE_DIR / "cache"
 
 # LoRA configuration file
 LORA_CONFIG_PATH = BASE_DIR / "lora_config.json"
 
-# Create necessary directories
-COVERS_DIR.mkdir(exist_ok=True)
-DATA_DIR.mkdir(exist_ok=True)
-LORA_DIR.mkdir(exist_ok=True)
+def ensure_directories():
+    """Create the output directories (called at startup, not on import)"""
+    for directory in (COVERS_DIR, DATA_DIR, LORA_DIR, CACHE_DIR):
+        directory.mkdir(exist_ok=True)
+
+# Startup mode: "lazy" creates clients on first use and validates credentials
+# in the background; "eager" probes the APIs before serving (old behavior)
+STARTUP_MODE = os.getenv("STARTUP_MODE", "lazy").lower()
+# Target time from process start until the app can take traffic
+COLD_START_TARGET_SECONDS = float(os.getenv("COLD_START_TARGET_SECONDS", "2.0"))
+# Seconds after a failed credential check before a request triggers another one
+SPOTIFY_REVALIDATE_INTERVAL = float(os.getenv("SPOTIFY_REVALIDATE_INTERVAL", "60"))
 
 # Spotify API
 SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
 SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
 SPOTIFY_REDIRECT_URI = os.getenv("SPOTIFY_REDIRECT_URI", "http://localhost:8888/callback")
 
+# Number of pooled Spotify clients, and keep-alive connections per client
+SPOTIFY_POOL_SIZE = int(os.getenv("SPOTIFY_POOL_SIZE", "16"))
+SPOTIFY_POOL_CONNECTIONS = int(os.getenv("SPOTIFY_POOL_CONNECTIONS", "4"))
+
+# Upper bound on tracks read from a single playlist or album
+SPOTIFY_MAX_TRACKS = int(os.getenv("SPOTIFY_MAX_TRACKS", "5000"))
+# Number of pages fetched concurrently once the total is known
+SPOTIFY_PAGE_WORKERS = int(os.getenv("SPOTIFY_PAGE_WORKERS", "8"))
+# Number of 50-artist batches resolved concurrently
+SPOTIFY_ARTIST_WORKERS = int(os.getenv("SPOTIFY_ARTIST_WORKERS", "8"))
+# Number of playlists read concurrently by batch analysis, and the most URLs per batch
+SPOTIFY_BATCH_WORKERS = int(os.getenv("SPOTIFY_BATCH_WORKERS", "4"))
+MAX_BATCH_URLS = int(os.getenv("MAX_BATCH_URLS", "100"))
+# Worker processes for sharded offline analysis (defaults to the CPU count)
+ANALYSIS_PROCESSES = int(os.getenv("ANALYSIS_PROCESSES", "0")) or os.cpu_count() or 1
+# Request rate shared by all threads (requests per second, and burst size)
+SPOTIFY_RATE_LIMIT = float(os.getenv("SPOTIFY_RATE_LIMIT", "10"))
+SPOTIFY_RATE_BURST = int(os.getenv("SPOTIFY_RATE_BURST", "20"))
+# Extra attempts after a 429 response once spotipy's own retries are used up
+SPOTIFY_MAX_429_RETRIES = int(os.getenv("SPOTIFY_MAX_429_RETRIES", "3"))
+
+# Persistent artist -> genres cache (seconds before an entry is refreshed)
+ARTIST_CACHE_PATH = Path(os.getenv("ARTIST_CACHE_PATH", str(CACHE_DIR / "artist_genres.sqlite3")))
+ARTIST_CACHE_TTL = int(os.getenv("ARTIST_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Persistent PlaylistData cache keyed by playlist snapshot_id (albums never expire)
+PLAYLIST_CACHE_PATH = Path(os.getenv("PLAYLIST_CACHE_PATH", str(CACHE_DIR / "playlist_data.sqlite3")))
+
+# Content-addressed cache of generated images, evicted oldest-first past the size cap
+IMAGE_CACHE_ENABLED = os.getenv("IMAGE_CACHE_ENABLED", "True").lower() in ("true", "1", "yes")
+IMAGE_CACHE_DIR = Path(os.getenv("IMAGE_CACHE_DIR", str(CACHE_DIR / "images")))
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+# Resized/WebP versions of covers ("name:pixels" pairs), and whether they are
+# built right after generation rather than on first request
+DERIVATIVES_DIR = Path(os.getenv("DERIVATIVES_DIR", str(CACHE_DIR / "derivatives")))
+def _parse_derivative_sizes(value):
+    """Parse "name:pixels,..." and skip empty or malformed entries"""
+    sizes = {}
+    for item in value.split(","):
+        name, _, pixels = item.strip().partition(":")
+        if name and pixels.strip().isdigit():
+            sizes[name] = int(pixels)
+        elif item.strip():
+            print(f"Warning: ignoring invalid COVER_DERIVATIVE_SIZES entry '{item}'")
+    return sizes
+
+COVER_DERIVATIVE_SIZES = _parse_derivative_sizes(os.getenv("COVER_DERIVATIVE_SIZES", "thumb:256,medium:512"))
+COVER_DERIVATIVES_EAGER = os.getenv("COVER_DERIVATIVES_EAGER", "True").lower() in ("true", "1", "yes")
+# Browser cache lifetime of covers (they never change once written)
+COVER_CACHE_MAX_AGE = int(os.getenv("COVER_CACHE_MAX_AGE", str(365 * 24 * 3600)))
+
+# Background generation jobs: worker threads, most jobs waiting, and how long
+# finished jobs are kept (seconds)
+JOB_DB_PATH = Path(os.getenv("JOB_DB_PATH", str(CACHE_DIR / "jobs.sqlite3")))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "50"))
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", str(7 * 24 * 3600)))
+# Workers mark their running jobs alive every JOB_HEARTBEAT_INTERVAL seconds; a
+# running job without a heartbeat for JOB_STALE_AFTER seconds is run again
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "10"))
+JOB_STALE_AFTER = float(os.getenv("JOB_STALE_AFTER", "60"))
+
+def _parse_stage_timeouts(value, defaults):
+    """Override defaults with "stage:seconds,..." and skip malformed entries or unknown stages"""
+    timeouts = dict(defaults)
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        name, _, seconds = (part.strip() for part in item.partition(":"))
+        if name not in defaults:
+            print(f"Warning: ignoring PIPELINE_STAGE_TIMEOUTS entry '{item.strip()}' for unknown stage (expected one of {', '.join(defaults)})")
+            continue
+        try:
+            timeouts[name] = float(seconds)
+        except ValueError:
+            print(f"Warning: ignoring invalid PIPELINE_STAGE_TIMEOUTS entry '{item.strip()}'")
+    return timeouts
+
+# Seconds each generate_cover stage may take ("stage:seconds" pairs override the defaults)
+PIPELINE_STAGE_TIMEOUTS = _parse_stage_timeouts(
+    os.getenv("PIPELINE_STAGE_TIMEOUTS", ""),
+    {"extract": 120.0, "title": 30.0, "analysis": 10.0, "chart": 30.0, "image": 300.0, "history": 15.0}
+)
+# Worker threads shared by the blocking steps of all generate_cover pipelines
+PIPELINE_THREAD_WORKERS = int(os.getenv("PIPELINE_THREAD_WORKERS", "16"))
+
+# Identical concurrent extractions/title calls are coalesced into one; lock files
+# extend this across worker processes, which wait at most COALESCE_WAIT_TIMEOUT
+COALESCE_LOCK_DIR = Path(os.getenv("COALESCE_LOCK_DIR", str(CACHE_DIR / "locks")))
+COALESCE_WAIT_TIMEOUT = float(os.getenv("COALESCE_WAIT_TIMEOUT", "180"))
+
 # Gemini API
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1/models/gemini-2.0-flash:generateContent"
 
+# Titles requested per Gemini call; unused ones are pooled per genre/mood/style
+# signature and handed out to later generations for up to TITLE_POOL_TTL seconds
+TITLE_CANDIDATES = int(os.getenv("TITLE_CANDIDATES", "8"))
+TITLE_POOL_PATH = Path(os.getenv("TITLE_POOL_PATH", str(CACHE_DIR / "title_pool.sqlite3")))
+TITLE_POOL_TTL = int(os.getenv("TITLE_POOL_TTL", str(30 * 24 * 3600)))
+
+# Every Gemini title call must answer within TITLE_TIMEOUT seconds. A hedged
+# second request starts once the first is slower than the recent p95 latency
+# (at least TITLE_HEDGE_MIN_DELAY). After TITLE_BREAKER_FAILURES failed calls in
+# a row Gemini is skipped for TITLE_BREAKER_COOLDOWN seconds and titles come
+# from the offline generator
+TITLE_TIMEOUT = float(os.getenv("TITLE_TIMEOUT", "8"))
+TITLE_HEDGE_ENABLED = os.getenv("TITLE_HEDGE_ENABLED", "True").lower() in ("true", "1", "yes")
+TITLE_HEDGE_MIN_DELAY = float(os.getenv("TITLE_HEDGE_MIN_DELAY", "1.5"))
+TITLE_BREAKER_FAILURES = int(os.getenv("TITLE_BREAKER_FAILURES", "3"))
+TITLE_BREAKER_COOLDOWN = float(os.getenv("TITLE_BREAKER_COOLDOWN", "60"))
+
 # Stability AI API 
 STABILITY_API_KEY = os.getenv("STABILITY_API_KEY")
 # Stable Diffusion 3.5 Large engine ID
 SD_3_5_LARGE_ENGINE = "sd3.5-large"
+# Image backend: "stability" (the real API), "local" (stand-in HTTP server from
+# local_image_server.py) or "fake" (in-process, no network)
+IMAGE_BACKEND = os.getenv("IMAGE_BACKEND", "stability").lower()
+LOCAL_IMAGE_BACKEND_URL = os.getenv("LOCAL_IMAGE_BACKEND_URL", "http://127.0.0.1:7860/v2beta/stable-image/generate/sd3")
+# Simulated delay (seconds), failure rate (0-1) and image size of the local and fake backends
+FAKE_IMAGE_LATENCY = float(os.getenv("FAKE_IMAGE_LATENCY", "0"))
+FAKE_IMAGE_ERROR_RATE = float(os.getenv("FAKE_IMAGE_ERROR_RATE", "0"))
+FAKE_IMAGE_SIZE = int(os.getenv("FAKE_IMAGE_SIZE", "1024"))
+# Most seeds generated per request in variants mode, and how many run at once
+MAX_IMAGE_VARIANTS = int(os.getenv("MAX_IMAGE_VARIANTS", "8"))
+IMAGE_VARIANT_CONCURRENCY = int(os.getenv("IMAGE_VARIANT_CONCURRENCY", "4"))
+# "binary" streams raw image bytes to disk; "json" asks for base64 JSON (old behavior)
+STABILITY_RESPONSE_MODE = os.getenv("STABILITY_RESPONSE_MODE", "binary").lower()
+# Keep-alive connections to the Stability API, and the largest image accepted
+STABILITY_POOL_CONNECTIONS = int(os.getenv("STABILITY_POOL_CONNECTIONS", "4"))
+STABILITY_MAX_IMAGE_BYTES = int(os.getenv("STABILITY_MAX_IMAGE_BYTES", str(50 * 1024 * 1024)))
+# Seconds an image request may wait to connect, or between bytes of the response
+STABILITY_TIMEOUT = float(os.getenv("STABILITY_TIMEOUT", "120"))
 
 # Civitai API - for fetching LoRA details
 CIVITAI_API_ENABLED = os.getenv("CIVITAI_API_ENABLED", "True").lower() in ("true", "1", "yes")
 
+# Format of saved generation history: "msgpack" (compact binary) or "json"
+HISTORY_FORMAT = os.getenv("HISTORY_FORMAT", "msgpack").lower()
+if HISTORY_FORMAT not in ("msgpack", "json"):
+    print(f"Warning: unknown HISTORY_FORMAT '{HISTORY_FORMAT}', saving history as JSON")
+    HISTORY_FORMAT = "json"
+
 # Flask configuration
 FLASK_SECRET_KEY = os.getenv("FLASK_SECRET_KEY")
 
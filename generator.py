@@ -1,50 +1,25 @@
 import os
+import asyncio
 import datetime
 from pathlib import Path
 
+import aiohttp
+
 from spotify_client import extract_playlist_data
-from image_generator import create_prompt_from_data, generate_cover_image
-from title_generator import generate_title
+from image_generator import (
+    create_prompt_from_data, generate_cover_image_async, generate_cover_variants_async,
+    variant_seeds, variant_path, create_contact_sheet
+)
+from title_generator import generate_title_async, DEFAULT_TITLE
 from chart_generator import generate_genre_chart
+from image_derivatives import schedule_derivatives
 from utils import save_generation_data, create_image_filename, get_available_loras
 from models import GenerationResult
-from config import COVERS_DIR
+from config import COVERS_DIR, MAX_IMAGE_VARIANTS, COVER_DERIVATIVES_EAGER, PIPELINE_STAGE_TIMEOUTS, ensure_directories
+from pipeline import Stage, PipelineAbort, run_stages, run_in_thread
 
-def generate_cover(url, user_mood=None, lora_input=None, output_path=None):
-    """Generate album cover and title from Spotify URL and save data"""
-    print(f"Processing Spotify URL: {url}")
-    
-    # Extract playlist/album data
-    playlist_data = extract_playlist_data(url)
-    if isinstance(playlist_data, dict) and "error" in playlist_data:
-        return {"error": playlist_data["error"]}
-    
-    print(f"\nSuccessfully extracted data for: {playlist_data.item_name}")
-    print(f"Top genres identified: {', '.join(playlist_data.genre_analysis.top_genres)}")
-    
-    # Convert playlist data to dictionary
-    data = playlist_data.to_dict()
-    
-    # Create image prompt
-    base_image_prompt = create_prompt_from_data(data, user_mood)
-    
-    # Generate title
-    title = generate_title(data, user_mood)
-    print(f"Generated title: {title}")
-    
-    # Add title to data
-    data["title"] = title
-    
-    # Create final image prompt with title
-    image_prompt = f"{base_image_prompt}, representing the album '{title}'"
-    print(f"Final image prompt with title: {image_prompt}")
-    
-    # Determine output path
-    if not output_path:
-        img_filename = create_image_filename(title)
-        output_path = COVERS_DIR / img_filename
-    
-    # Process LoRA input
+def resolve_lora(lora_input):
+    """Resolve LoRA input (name, URL, LoraModel or dict) into (lora, name, type, url)"""
     lora = None
     lora_name = ""
     lora_type = "none"
@@ -72,7 +47,7 @@ def generate_cover(url, user_mood=None, lora_input=None, output_path=None):
                 available_loras = get_available_loras()
                 for available_lora in available_loras:
                     if available_lora.name == lora_input:
-                        lora = available_lora.__dict__
+                        lora = available_lora.to_dict()
                         lora_name = available_lora.name
                         lora_type = available_lora.source_type
                         lora_url = available_lora.url
@@ -97,33 +72,183 @@ def generate_cover(url, user_mood=None, lora_input=None, output_path=None):
                 lora_type = lora_input.get('source_type', 'local')
                 lora_url = lora_input.get('url', '')
     
-    # Generate cover image
-    success = generate_cover_image(image_prompt, lora, output_path)
-    
-    if not success:
-        return {"error": "Failed to generate cover image"}
-    
-    # Current timestamp
-    timestamp = str(datetime.datetime.now())
-    
-    # Create result object
-    result = GenerationResult(
-        title=title,
-        output_path=str(output_path),
-        playlist_data=playlist_data,
-        user_mood=user_mood,
-        lora_name=lora_name,
-        lora_type=lora_type,
-        lora_url=lora_url,
-        timestamp=timestamp
-    )
-    
-    # Convert to dict for saving
-    result_dict = result.to_dict()
-    
-    # Save data to JSON file
-    data_file = save_generation_data(result_dict)
-    if data_file:
-        result_dict["data_file"] = data_file
+    return lora, lora_name, lora_type, lora_url
+
+def generate_cover(url, user_mood=None, lora_input=None, output_path=None, seed=None, variants=1, contact_sheet=False):
+    """Generate album cover and title from Spotify URL and save data
+
+    Runs its own event loop, so it cannot be called from async code (it
+    raises RuntimeError there); await generate_cover_async instead.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        raise RuntimeError("generate_cover() was called from a running event loop; await generate_cover_async() instead")
+    
+    return asyncio.run(generate_cover_async(
+        url, user_mood, lora_input, output_path, seed=seed, variants=variants, contact_sheet=contact_sheet
+    ))
+
+async def generate_cover_async(url, user_mood=None, lora_input=None, output_path=None, session=None, seed=None,
+                               variants=1, contact_sheet=False):
+    """Generate album cover and title on the running event loop
+
+    Gemini and Stability are called through an aiohttp session (one is
+    created for the call if none is given). Spotify extraction uses the
+    synchronous spotipy pool, so it runs in a worker thread. Passing a
+    seed makes the image reproducible, and repeats are served from the
+    image cache.
+
+    With variants > 1 that many seeds are generated in parallel for the
+    same prompt; output_path is the first one and all of them are listed
+    under "variants", with an optional contact sheet of the whole set.
+
+    The steps run as a dependency graph (see pipeline.run_stages): the
+    genre chart and percentages are produced while the image is generated,
+    and each step has its own timeout.
+    """
+    if session is None:
+        async with aiohttp.ClientSession() as own_session:
+            return await generate_cover_async(url, user_mood, lora_input, output_path, own_session, seed, variants, contact_sheet)
+    
+    ensure_directories()
+    print(f"Processing Spotify URL: {url}")
     
-    return result_dict
\ No newline at end of file
+    variants = max(1, min(variants, MAX_IMAGE_VARIANTS))
+    
+    async def extract(results):
+        # Extract playlist/album data
+        playlist_data = await run_in_thread(extract_playlist_data, url)
+        if isinstance(playlist_data, dict) and "error" in playlist_data:
+            raise PipelineAbort(playlist_data["error"])
+        
+        print(f"\nSuccessfully extracted data for: {playlist_data.item_name}")
+        print(f"Top genres identified: {', '.join(playlist_data.genre_analysis.top_genres)}")
+        return playlist_data
+    
+    async def title(results):
+        # Generate title (concurrent requests with the same signature share one Gemini batch)
+        title = await generate_title_async(session, results["extract"].to_dict(), user_mood)
+        print(f"Generated title: {title}")
+        return title
+    
+    def analysis(results):
+        # Percentages for the result page, computed while the image is generated
+        return results["extract"].genre_analysis.get_percentages(max_genres=5)
+    
+    def chart(results):
+        return generate_genre_chart(results["extract"].genre_analysis)
+    
+    async def plan(results):
+        data = results["extract"].to_dict()
+        data["title"] = results["title"]
+        
+        # Create final image prompt with title
+        image_prompt = f"{create_prompt_from_data(data, user_mood)}, representing the album '{results['title']}'"
+        print(f"Final image prompt with title: {image_prompt}")
+        
+        return {
+            "image_prompt": image_prompt,
+            # Determine output path
+            "output_path": output_path or COVERS_DIR / create_image_filename(results["title"]),
+            # Process LoRA input
+            "lora": resolve_lora(lora_input),
+            "timestamp": str(datetime.datetime.now())
+        }
+    
+    async def image(results):
+        image_prompt = results["plan"]["image_prompt"]
+        path = results["plan"]["output_path"]
+        lora = results["plan"]["lora"][0]
+        variant_list = []
+        sheet_path = ""
+        
+        if variants == 1:
+            # Generate cover image
+            success = await generate_cover_image_async(session, image_prompt, lora, path, seed=seed)
+            
+            if not success:
+                raise PipelineAbort("Failed to generate cover image")
+        else:
+            # Generate all seeds at once and keep the ones that succeeded
+            seeds = variant_seeds(variants, seed)
+            paths = [variant_path(path, i) for i in range(variants)]
+            outcomes = await generate_cover_variants_async(session, image_prompt, lora, paths, seeds=seeds)
+            variant_list = [
+                {"seed": variant_seed, "output_path": str(variant_file)}
+                for (variant_seed, success), variant_file in zip(outcomes, paths) if success
+            ]
+            
+            if not variant_list:
+                raise PipelineAbort("Failed to generate cover image")
+            
+            print(f"Generated {len(variant_list)} of {variants} variants")
+            
+            if contact_sheet:
+                base_path = Path(path)
+                sheet_path = str(base_path.with_name(f"{base_path.stem}_sheet{base_path.suffix}"))
+                try:
+                    await run_in_thread(create_contact_sheet, [variant["output_path"] for variant in variant_list], sheet_path)
+                except Exception as e:
+                    # The variants are already paid for, so they are returned without a sheet
+                    print(f"Warning: could not create contact sheet: {e}")
+                    sheet_path = ""
+            
+            path = variant_list[0]["output_path"]
+        
+        # Build thumbnails and WebP versions in the background
+        if COVER_DERIVATIVES_EAGER:
+            schedule_derivatives([variant["output_path"] for variant in variant_list] or [path])
+        
+        return {"output_path": str(path), "variants": variant_list, "contact_sheet": sheet_path}
+    
+    def build_result(results):
+        """GenerationResult dict of the finished stages"""
+        generated = results["image"]
+        _, lora_name, lora_type, lora_url = results["plan"]["lora"]
+        return GenerationResult(
+            title=results["title"],
+            output_path=generated["output_path"],
+            playlist_data=results["extract"],
+            user_mood=user_mood,
+            lora_name=lora_name,
+            lora_type=lora_type,
+            lora_url=lora_url,
+            timestamp=results["plan"]["timestamp"],
+            variants=generated["variants"],
+            contact_sheet=generated["contact_sheet"]
+        ).to_dict()
+    
+    def history(results):
+        # Save data to the history file
+        return save_generation_data(build_result(results))
+    
+    timeouts = PIPELINE_STAGE_TIMEOUTS
+    stages = [
+        Stage("extract", extract, timeout=timeouts["extract"]),
+        Stage("title", title, ("extract",), timeouts["title"], required=False, default=DEFAULT_TITLE),
+        Stage("analysis", analysis, ("extract",), timeouts["analysis"], required=False),
+        Stage("chart", chart, ("extract",), timeouts["chart"], required=False),
+        Stage("plan", plan, ("title",)),
+        Stage("image", image, ("plan",), timeouts["image"]),
+        # Written only once the image exists, so a failed generation leaves no
+        # record behind (a thread running a cancelled stage cannot be stopped)
+        Stage("history", history, ("image",), timeouts["history"], required=False)
+    ]
+    
+    try:
+        run = await run_stages(stages)
+    except PipelineAbort as e:
+        return {"error": str(e)}
+    
+    result_dict = build_result(run.results)
+    if run.results["history"]:
+        result_dict["data_file"] = run.results["history"]
+    if run.results["analysis"] is not None:
+        result_dict["genre_percentages"] = run.results["analysis"]
+    result_dict["genres_chart"] = run.results["chart"]
+    result_dict["stage_timings"] = run.timings
+    
+    return result_dict
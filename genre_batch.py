@@ -0,0 +1,136 @@
+from collections import Counter
+from dataclasses import dataclass
+from typing import List, Dict
+
+import numpy as np
+
+from models import GenreAnalysis, MOOD_KEYWORDS, classify_genre
+
+MOOD_NAMES = list(MOOD_KEYWORDS)
+
+class GenreVocabulary:
+    """Shared genre -> column index mapping with per-genre mood and energy weights"""
+
+    def __init__(self, genres):
+        # Sorted so that a stable sort by count breaks ties by name,
+        # matching GenreAnalysis.from_genre_counts
+        self.genres = sorted(set(genres))
+        self.index = {genre: i for i, genre in enumerate(self.genres)}
+
+        # genre x mood weight matrix and low/high energy indicator vectors
+        self.mood_weights = np.zeros((len(self.genres), len(MOOD_NAMES)), dtype=np.int64)
+        self.low_energy = np.zeros(len(self.genres), dtype=np.int64)
+        self.high_energy = np.zeros(len(self.genres), dtype=np.int64)
+
+        for i, genre in enumerate(self.genres):
+            moods, is_low, is_high = classify_genre(genre)
+            for mood in moods:
+                self.mood_weights[i, MOOD_NAMES.index(mood)] = 1
+            self.low_energy[i] = is_low
+            self.high_energy[i] = is_high
+
+    def __len__(self):
+        return len(self.genres)
+
+    def count_matrix(self, genre_counts_list):
+        """Build a playlists x genres count matrix (genres outside the vocabulary are skipped)"""
+        matrix = np.zeros((len(genre_counts_list), len(self.genres)), dtype=np.int64)
+        for row, genre_counts in enumerate(genre_counts_list):
+            for genre, count in genre_counts.items():
+                column = self.index.get(genre)
+                if column is not None:
+                    matrix[row, column] = count
+        return matrix
+
+@dataclass
+class GenreBatchResult:
+    """Vectorized analysis of many playlists against one vocabulary"""
+    vocabulary: GenreVocabulary
+    genre_counts: List[Dict[str, int]]  # Input counts, one mapping per playlist
+    moods: List[str]
+    energy_levels: List[str]
+    top_indices: np.ndarray  # playlists x top_k genre indices, most frequent first
+    top_counts: np.ndarray  # playlists x top_k counts matching top_indices
+    totals: np.ndarray  # total genre occurrences per playlist
+
+    def top_genres(self, row, k=10):
+        """Top k genres of one playlist"""
+        return [self.vocabulary.genres[i] for i, c in zip(self.top_indices[row, :k], self.top_counts[row, :k]) if c > 0]
+
+    def genres_with_counts(self, row, k=20):
+        """Top k (genre, count) pairs of one playlist"""
+        return [
+            (self.vocabulary.genres[i], int(c))
+            for i, c in zip(self.top_indices[row, :k], self.top_counts[row, :k]) if c > 0
+        ]
+
+    def percentages(self, max_genres=5):
+        """Percentage of each playlist's top genres, as a playlists x max_genres array"""
+        totals = np.maximum(self.totals, 1)[:, None]
+        return np.round(self.top_counts[:, :max_genres] / totals * 100).astype(np.int64)
+
+    def get_percentages(self, row, max_genres=5):
+        """Percentages of one playlist in the same format as GenreAnalysis.get_percentages"""
+        percentages = self.percentages(max_genres)[row]
+        return [
+            {"name": genre, "percentage": int(percentage)}
+            for (genre, _), percentage in zip(self.genres_with_counts(row, max_genres), percentages)
+        ]
+
+    def to_genre_analysis(self, row):
+        """Build the GenreAnalysis of one playlist"""
+        if not self.totals[row]:
+            return GenreAnalysis()
+        return GenreAnalysis(
+            genre_counts=GenreAnalysis.rank_counts(self.genre_counts[row]),
+            mood=self.moods[row],
+            energy_level=self.energy_levels[row]
+        )
+
+def analyze_genre_batch(genre_counts_list, top_k=20, chunk_size=1024, vocabulary=None):
+    """Score many playlists at once with matrix operations
+
+    genre_counts_list holds one genre->count mapping (or plain genre list)
+    per playlist. Playlists are processed in chunks of chunk_size rows to
+    bound the size of the dense count matrix.
+    """
+    genre_counts_list = [
+        Counter(genres) if isinstance(genres, list) else genres
+        for genres in genre_counts_list
+    ]
+    if vocabulary is None:
+        vocabulary = GenreVocabulary(genre for counts in genre_counts_list for genre in counts)
+
+    top_k = min(top_k, len(vocabulary))
+    moods, energy_levels, top_indices, top_counts, totals = [], [], [], [], []
+
+    for start in range(0, len(genre_counts_list), chunk_size):
+        counts = vocabulary.count_matrix(genre_counts_list[start:start+chunk_size])
+
+        # Mood scores: counts x (genre x mood) weights; argmax picks the first
+        # best mood like max() does, and rows without matches stay balanced
+        mood_scores = counts @ vocabulary.mood_weights
+        best = mood_scores.argmax(axis=1)
+        has_mood = mood_scores.max(axis=1) > 0
+        moods.extend(MOOD_NAMES[b] if ok else "balanced" for b, ok in zip(best, has_mood))
+
+        low = counts @ vocabulary.low_energy
+        high = counts @ vocabulary.high_energy
+        energy_levels.extend(np.where(high > low, "energetic", np.where(low > high, "calm", "balanced")).tolist())
+
+        # Stable sort on descending counts keeps alphabetical order among ties
+        order = np.argsort(-counts, axis=1, kind="stable")[:, :top_k]
+        top_indices.append(order)
+        top_counts.append(np.take_along_axis(counts, order, axis=1))
+        totals.append(counts.sum(axis=1))
+
+    empty = np.zeros((0, top_k), dtype=np.int64)
+    return GenreBatchResult(
+        vocabulary=vocabulary,
+        genre_counts=genre_counts_list,
+        moods=moods,
+        energy_levels=energy_levels,
+        top_indices=np.concatenate(top_indices) if top_indices else empty,
+        top_counts=np.concatenate(top_counts) if top_counts else empty,
+        totals=np.concatenate(totals) if totals else np.zeros(0, dtype=np.int64)
+    )
@@ -0,0 +1,372 @@
+import abc
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import aiohttp
+import requests
+from PIL import Image
+from requests.adapters import HTTPAdapter
+
+from config import (
+    STABILITY_API_KEY, STABILITY_RESPONSE_MODE, STABILITY_POOL_CONNECTIONS, STABILITY_MAX_IMAGE_BYTES, STABILITY_TIMEOUT,
+    IMAGE_BACKEND, LOCAL_IMAGE_BACKEND_URL, FAKE_IMAGE_LATENCY, FAKE_IMAGE_ERROR_RATE, FAKE_IMAGE_SIZE
+)
+
+STABILITY_API_URL = "https://api.stability.ai/v2beta/stable-image/generate/sd3"
+
+# Size of each chunk read from a streamed image response
+IMAGE_CHUNK_SIZE = 64 * 1024
+
+# Magic bytes at the start of each output format
+IMAGE_SIGNATURES = {
+    "png": b"\x89PNG\r\n\x1a\n",
+    "jpeg": b"\xff\xd8\xff",
+    "webp": b"RIFF"
+}
+
+# Shared keep-alive session for image backend calls, created on first use
+_http_session = None
+_session_lock = threading.Lock()
+
+def get_http_session():
+    """Get the pooled requests.Session used for image backend calls"""
+    global _http_session
+    with _session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=STABILITY_POOL_CONNECTIONS, pool_maxsize=STABILITY_POOL_CONNECTIONS)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_session = session
+        return _http_session
+
+def get_stability_headers(accept="application/json"):
+    """Headers for Stability API requests ("image/*" asks for the raw image)"""
+    return {
+        "Authorization": f"Bearer {STABILITY_API_KEY}",
+        "Accept": accept
+    }
+
+def stability_client_timeout():
+    """aiohttp timeout matching the requests timeout of the sync calls (per connect and read)"""
+    return aiohttp.ClientTimeout(total=None, sock_connect=STABILITY_TIMEOUT, sock_read=STABILITY_TIMEOUT)
+
+def build_form_fields(params):
+    """Convert params to multipart/form-data string fields"""
+    fields = {}
+    for key, value in params.items():
+        if isinstance(value, (int, float)):
+            value = str(value)
+        fields[key] = value
+    return fields
+
+class ImageSink:
+    """Receive image bytes in chunks, checking size and format as they arrive
+
+    With an output_path the bytes go to a temporary file next to it, which
+    replaces output_path once complete; otherwise they are kept in memory.
+    """
+
+    def __init__(self, image_format="png", output_path=None, max_bytes=STABILITY_MAX_IMAGE_BYTES):
+        self.signature = IMAGE_SIGNATURES.get(image_format, b"")
+        self.output_path = output_path
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._header = b""
+        self._tmp_path = None
+        if output_path:
+            fd, self._tmp_path = tempfile.mkstemp(dir=Path(output_path).parent, suffix=".part")
+            self._file = os.fdopen(fd, "wb")
+        else:
+            self._file = io.BytesIO()
+
+    def write(self, chunk):
+        """Append a chunk, failing as soon as the image is too large or the wrong format"""
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise ValueError(f"Image is larger than {self.max_bytes} bytes")
+        if len(self._header) < len(self.signature):
+            self._header += chunk[:len(self.signature) - len(self._header)]
+            if not self.signature.startswith(self._header):
+                raise ValueError("Response is not an image of the requested format")
+        self._file.write(chunk)
+
+    def finish(self):
+        """Complete the image: True once saved to output_path, otherwise the bytes"""
+        if self._header != self.signature:
+            raise ValueError("Response ended before a complete image was received")
+        if self._tmp_path:
+            self._file.close()
+            os.replace(self._tmp_path, self.output_path)
+            self._tmp_path = None
+            print(f"Image saved to {self.output_path}")
+            return True
+        return self._file.getvalue()
+
+    def discard(self):
+        """Drop a partially received image"""
+        self._file.close()
+        if self._tmp_path and os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+        self._tmp_path = None
+
+def post_image_request(url, params, headers, output_path=None):
+    """POST params as multipart/form-data and stream the image in the response
+
+    Returns True once output_path is written, the image bytes when no
+    output_path is given, or None if the service returned an error.
+    """
+    files = {key: (None, value) for key, value in build_form_fields(params).items()}
+    
+    with get_http_session().post(url, files=files, headers=headers, stream=True, timeout=STABILITY_TIMEOUT) as response:
+        if response.status_code != 200:
+            print(f"Error: API returned status code {response.status_code}")
+            print(f"Response: {response.text}")
+            return None
+        
+        sink = ImageSink(params["output_format"], output_path)
+        try:
+            for chunk in response.iter_content(IMAGE_CHUNK_SIZE):
+                sink.write(chunk)
+            return sink.finish()
+        except BaseException:
+            sink.discard()
+            raise
+
+async def post_image_request_async(session, url, params, headers, output_path=None):
+    """POST params as multipart/form-data on an aiohttp session and stream the image"""
+    form = aiohttp.FormData()
+    for key, value in build_form_fields(params).items():
+        form.add_field(key, value)
+    
+    async with session.post(url, data=form, headers=headers, timeout=stability_client_timeout()) as response:
+        if response.status != 200:
+            print(f"Error: API returned status code {response.status}")
+            print(f"Response: {await response.text()}")
+            return None
+        
+        sink = ImageSink(params["output_format"], output_path)
+        try:
+            async for chunk in response.content.iter_chunked(IMAGE_CHUNK_SIZE):
+                sink.write(chunk)
+            return sink.finish()
+        except BaseException:
+            sink.discard()
+            raise
+
+def send_generation_request(url, params):
+    """Send request to Stability API using multipart/form-data"""
+    if not STABILITY_API_KEY:
+        print("ERROR: Missing Stability API key. Please set STABILITY_API_KEY in your .env file.")
+        return None
+        
+    headers = get_stability_headers()
+    files = {key: (None, value) for key, value in build_form_fields(params).items()}
+    
+    response = get_http_session().post(url, files=files, headers=headers, timeout=STABILITY_TIMEOUT)
+    
+    if response.status_code != 200:
+        print(f"Error: API returned status code {response.status_code}")
+        print(f"Response: {response.text}")
+        return None
+    
+    return response.json()
+
+def stream_generation_request(url, params, output_path=None):
+    """Request the raw image from Stability and stream it to output_path without decoding it"""
+    if not STABILITY_API_KEY:
+        print("ERROR: Missing Stability API key. Please set STABILITY_API_KEY in your .env file.")
+        return None
+    
+    return post_image_request(url, params, get_stability_headers("image/*"), output_path)
+
+async def send_generation_request_async(session, url, params):
+    """Send request to Stability API using multipart/form-data on an aiohttp session"""
+    if not STABILITY_API_KEY:
+        print("ERROR: Missing Stability API key. Please set STABILITY_API_KEY in your .env file.")
+        return None
+    
+    form = aiohttp.FormData()
+    for key, value in build_form_fields(params).items():
+        form.add_field(key, value)
+    
+    async with session.post(url, data=form, headers=get_stability_headers(), timeout=stability_client_timeout()) as response:
+        if response.status != 200:
+            print(f"Error: API returned status code {response.status}")
+            print(f"Response: {await response.text()}")
+            return None
+        
+        return await response.json()
+
+async def stream_generation_request_async(session, url, params, output_path=None):
+    """Request the raw image from Stability on an aiohttp session and stream it to output_path"""
+    if not STABILITY_API_KEY:
+        print("ERROR: Missing Stability API key. Please set STABILITY_API_KEY in your .env file.")
+        return None
+    
+    return await post_image_request_async(session, url, params, get_stability_headers("image/*"), output_path)
+
+def decode_generation_response(response_data):
+    """Get the raw image bytes from a JSON API response, or None"""
+    # Check if we got a valid response
+    if not response_data:
+        return None
+        
+    # Extract image data
+    if "image" in response_data:
+        return base64.b64decode(response_data["image"])
+    
+    print("No image data found in the response.")
+    print(f"Response structure: {json.dumps(list(response_data.keys()), indent=2)}")
+    return None
+
+def save_image_bytes(image_bytes, output_path, image_format="png"):
+    """Write image bytes to output_path as-is and return True"""
+    sink = ImageSink(image_format, output_path)
+    try:
+        sink.write(image_bytes)
+        return sink.finish()
+    except BaseException:
+        sink.discard()
+        raise
+
+def deliver_image_bytes(image_bytes, output_path=None, image_format="png"):
+    """Backend return value for image bytes: True once written to output_path, else the bytes"""
+    if output_path:
+        return save_image_bytes(image_bytes, output_path, image_format)
+    return image_bytes
+
+def render_placeholder_image(params, size=FAKE_IMAGE_SIZE):
+    """Deterministic stand-in image: the same params always give the same bytes
+
+    The pixels are seeded noise, so the encoded file is about as large as
+    a real generation and costs a realistic amount to move around.
+    """
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode("utf-8")).digest()
+    rng = random.Random(digest)
+    image = Image.frombytes("RGB", (size, size), rng.randbytes(size * size * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format=params.get("output_format", "png"))
+    return buffer.getvalue()
+
+class ImageBackend(abc.ABC):
+    """Interface of an image generation service
+
+    generate and generate_async take Stability-style params and return
+    True once the image is written to output_path, the image bytes when no
+    output_path is given, or None if generation failed.
+    """
+    name = "base"
+
+    def check_configuration(self):
+        """Return an error message if the backend cannot be used, or None"""
+        return None
+
+    @abc.abstractmethod
+    def generate(self, params, output_path=None):
+        """Generate an image synchronously"""
+
+    async def generate_async(self, session, params, output_path=None):
+        """Generate on the event loop (by default, generate runs in a worker thread)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.generate, params, output_path)
+
+class StabilityBackend(ImageBackend):
+    """Stability AI REST API"""
+    name = "stability"
+
+    def __init__(self, url=STABILITY_API_URL, response_mode=STABILITY_RESPONSE_MODE):
+        self.url = url
+        self.response_mode = response_mode
+
+    def check_configuration(self):
+        if not STABILITY_API_KEY:
+            return "Missing Stability API key. Please set STABILITY_API_KEY in your .env file."
+        return None
+
+    def generate(self, params, output_path=None):
+        if self.response_mode == "json":
+            image_bytes = decode_generation_response(send_generation_request(self.url, params))
+            if image_bytes is None:
+                return None
+            return deliver_image_bytes(image_bytes, output_path, params["output_format"])
+        return stream_generation_request(self.url, params, output_path)
+
+    async def generate_async(self, session, params, output_path=None):
+        if self.response_mode == "json":
+            image_bytes = decode_generation_response(await send_generation_request_async(session, self.url, params))
+            if image_bytes is None:
+                return None
+            return deliver_image_bytes(image_bytes, output_path, params["output_format"])
+        return await stream_generation_request_async(session, self.url, params, output_path)
+
+class LocalHTTPBackend(ImageBackend):
+    """Stand-in HTTP service speaking the Stability protocol (see local_image_server.py)"""
+    name = "local"
+
+    def __init__(self, url=LOCAL_IMAGE_BACKEND_URL):
+        self.url = url
+
+    def generate(self, params, output_path=None):
+        return post_image_request(self.url, params, {"Accept": "image/*"}, output_path)
+
+    async def generate_async(self, session, params, output_path=None):
+        return await post_image_request_async(session, self.url, params, {"Accept": "image/*"}, output_path)
+
+class FakeImageBackend(ImageBackend):
+    """In-process backend returning deterministic images after a simulated delay"""
+    name = "fake"
+
+    def __init__(self, latency=FAKE_IMAGE_LATENCY, error_rate=FAKE_IMAGE_ERROR_RATE, size=FAKE_IMAGE_SIZE):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.size = size
+
+    def _render(self, params, output_path=None):
+        if random.random() < self.error_rate:
+            print("Error: fake image backend simulated a failure")
+            return None
+        image_bytes = render_placeholder_image(params, self.size)
+        return deliver_image_bytes(image_bytes, output_path, params["output_format"])
+
+    def generate(self, params, output_path=None):
+        time.sleep(self.latency)
+        return self._render(params, output_path)
+
+    async def generate_async(self, session, params, output_path=None):
+        await asyncio.sleep(self.latency)
+        # Encoding the image is CPU work, so it stays off the event loop
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._render, params, output_path)
+
+# Backends selectable through IMAGE_BACKEND
+IMAGE_BACKENDS = {
+    "stability": StabilityBackend,
+    "local": LocalHTTPBackend,
+    "fake": FakeImageBackend
+}
+
+def create_image_backend(name=IMAGE_BACKEND):
+    """Create an image backend by name"""
+    if name not in IMAGE_BACKENDS:
+        raise ValueError(f"Unknown image backend: {name} (expected one of {', '.join(IMAGE_BACKENDS)})")
+    return IMAGE_BACKENDS[name]()
+
+# Shared backend instance, created on first use
+_image_backend = None
+
+def get_image_backend():
+    """Get the image backend selected in config"""
+    global _image_backend
+    if _image_backend is None:
+        _image_backend = create_image_backend()
+    return _image_backend
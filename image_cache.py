@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from config import IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES
+
+def cache_key(params):
+    """Content address of a generation: a hash of every parameter sent to the backend"""
+    canonical = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+class ImageCache:
+    """Disk-backed, content-addressed image cache with a size cap and LRU eviction
+
+    Each image is stored as <key>.<ext>; a file's modification time records
+    its last use, so the least recently used files are evicted first.
+    """
+
+    def __init__(self, directory=IMAGE_CACHE_DIR, max_bytes=IMAGE_CACHE_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, key, extension="png"):
+        return self.directory / f"{key}.{extension}"
+
+    def get(self, key, extension="png"):
+        """Get the cached file path for a key, or None; marks the entry as recently used"""
+        path = self._path(key, extension)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, image_bytes, extension="png"):
+        """Store image bytes under a key and evict old entries if over the size cap"""
+        return self._store(key, extension, lambda f: f.write(image_bytes))
+
+    def put_file(self, key, source_path, extension="png"):
+        """Copy an image file into the cache under a key"""
+        def copy(f):
+            with open(source_path, "rb") as source:
+                shutil.copyfileobj(source, f)
+        return self._store(key, extension, copy)
+
+    def _store(self, key, extension, write):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(key, extension)
+
+        # Write to a temporary file first so readers never see a partial image
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self.evict()
+        return path
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+
+            if total <= self.max_bytes:
+                return
+
+            for _, size, path in sorted(entries):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+# Shared cache instance, created on first use
+_image_cache = None
+
+def get_image_cache():
+    """Get the shared image cache"""
+    global _image_cache
+    if _image_cache is None:
+        _image_cache = ImageCache()
+    return _image_cache
@@ -0,0 +1,103 @@
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+from PIL import Image
+
+from config import DERIVATIVES_DIR, COVER_DERIVATIVE_SIZES
+
+# Encoder options of each derivative format
+DERIVATIVE_FORMATS = {
+    "png": {"format": "PNG", "optimize": True},
+    "webp": {"format": "WEBP", "quality": 85, "method": 4}
+}
+
+DERIVATIVE_MIMETYPES = {
+    "png": "image/png",
+    "webp": "image/webp"
+}
+
+# Background workers that build derivatives of new covers
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="derivatives")
+
+def choose_format(requested=None, accept=""):
+    """Pick the output format: an explicit ?format= wins, otherwise WebP if the client accepts it"""
+    if requested:
+        return requested.lower()
+    return "webp" if "image/webp" in accept else "png"
+
+def derivative_path(source_path, size=None, image_format="png"):
+    """Where the derivative of a cover in a given size and format is stored"""
+    source_path = Path(source_path)
+    return DERIVATIVES_DIR / f"{source_path.stem}.{size or 'full'}.{image_format}"
+
+def render_derivative(source_path, target_path, size=None, image_format="png"):
+    """Resize and re-encode a cover into target_path"""
+    with Image.open(source_path) as image:
+        if size:
+            pixels = COVER_DERIVATIVE_SIZES[size]
+            image.thumbnail((pixels, pixels), Image.LANCZOS)
+
+        target_path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so a concurrent request never serves a partial image
+        fd, tmp_path = tempfile.mkstemp(dir=target_path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                image.save(f, **DERIVATIVE_FORMATS[image_format])
+            os.replace(tmp_path, target_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+def get_derivative(source_path, size=None, image_format="png"):
+    """Path of a cover in the given size and format, creating it on first use
+
+    The full-size PNG is the original file itself. Derivatives older than
+    their cover are rebuilt.
+    """
+    if size is None and image_format == "png":
+        return Path(source_path)
+
+    target_path = derivative_path(source_path, size, image_format)
+    try:
+        if target_path.stat().st_mtime >= os.stat(source_path).st_mtime:
+            return target_path
+    except FileNotFoundError:
+        pass
+
+    render_derivative(source_path, target_path, size, image_format)
+    return target_path
+
+def create_derivatives(source_path):
+    """Build every size of a cover in every format"""
+    for image_format in DERIVATIVE_FORMATS:
+        for size in [None, *COVER_DERIVATIVE_SIZES]:
+            get_derivative(source_path, size, image_format)
+
+def _create_derivatives_logged(source_path):
+    try:
+        create_derivatives(source_path)
+    except Exception as e:
+        print(f"Warning: could not create derivatives of {source_path}: {e}")
+
+def schedule_derivatives(source_paths):
+    """Build derivatives of new covers in the background"""
+    for source_path in source_paths:
+        _executor.submit(_create_derivatives_logged, source_path)
+
+@lru_cache(maxsize=4096)
+def _content_hash(path, mtime_ns, size):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:32]
+
+def file_etag(path):
+    """Strong ETag from a file's content, hashed once per version of the file"""
+    stat = os.stat(path)
+    return _content_hash(str(path), stat.st_mtime_ns, stat.st_size)
@@ -1,12 +1,15 @@
-import requests
-import json
 import os
-import base64
 from PIL import Image
 import io
-import time
+import math
+import asyncio
+import aiohttp
 import random
-from config import STABILITY_API_KEY, DEFAULT_NEGATIVE_PROMPT, COVERS_DIR
+import shutil
+from pathlib import Path
+from config import DEFAULT_NEGATIVE_PROMPT, COVERS_DIR, IMAGE_CACHE_ENABLED, IMAGE_VARIANT_CONCURRENCY
+from image_cache import cache_key, get_image_cache
+from image_backends import get_image_backend
 
 def create_prompt_from_data(playlist_data, user_mood=None):
     """Create optimized prompt for stable diffusion"""
@@ -29,42 +32,12 @@ def create_prompt_from_data(playlist_data, user_mood=None):
     
     return prompt
 
-def send_generation_request(url, params):
-    """Send request to Stability API using multipart/form-data"""
-    if not STABILITY_API_KEY:
-        print("ERROR: Missing Stability API key. Please set STABILITY_API_KEY in your .env file.")
-        return None
-        
-    headers = {
-        "Authorization": f"Bearer {STABILITY_API_KEY}",
-        "Accept": "application/json"
-    }
-    
-    # Convert params to multipart/form-data format
-    files = {}
-    for key, value in params.items():
-        if isinstance(value, (int, float)):
-            value = str(value)
-        files[key] = (None, value)
-    
-    response = requests.post(url, files=files, headers=headers)
-    
-    if response.status_code != 200:
-        print(f"Error: API returned status code {response.status_code}")
-        print(f"Response: {response.text}")
-        return None
-    
-    return response.json()
+def build_generation_params(prompt, lora=None, negative_prompt=DEFAULT_NEGATIVE_PROMPT, seed=None):
+    """Build the Stability API parameters, adding LoRA context to the prompt
 
-def generate_cover_image(prompt, lora=None, output_path=None, negative_prompt=DEFAULT_NEGATIVE_PROMPT):
-    """Generate album cover image using Stability AI SD 3.5 Large API"""
-    # Check if we have API key
-    if not STABILITY_API_KEY:
-        print("ERROR: Missing Stability API key. Please set STABILITY_API_KEY in your .env file.")
-        return False
-    
-    print(f"Generating with prompt: {prompt}")
-    
+    A random seed is picked unless one is given; a fixed seed makes the
+    request reproducible and therefore cacheable.
+    """
     # Check if we have a LoRA model
     if lora:
         lora_prompt = ""
@@ -87,12 +60,11 @@ def generate_cover_image(prompt, lora=None, output_path=None, negative_prompt=DE
             prompt = f"{prompt}, {lora_prompt}"
             print(f"Enhanced prompt with LoRA context: {prompt}")
     
-    url = "https://api.stability.ai/v2beta/stable-image/generate/sd3"
-    
-    seed = random.randint(1, 1000000)
+    if seed is None:
+        seed = random.randint(1, 1000000)
     
     # Prepare parameters for the API
-    params = {
+    return {
         "prompt": prompt,
         "negative_prompt": negative_prompt,
         "aspect_ratio": "1:1",  # Square aspect ratio for album covers
@@ -101,38 +73,204 @@ def generate_cover_image(prompt, lora=None, output_path=None, negative_prompt=DE
         "model": "sd3.5-large",  # Using the flagship model
         "mode": "text-to-image"
     }
+
+def image_cache_key(backend, params):
+    """Cache key of a generation; images from different backends never share entries"""
+    return cache_key({**params, "backend": backend.name})
+
+def load_cached_image(key, image_format, output_path=None):
+    """Serve a generation from the image cache, or return None on a miss
+
+    An entry evicted while it is read, or one that is not a valid image,
+    counts as a miss (and a corrupt entry is removed).
+    """
+    if not IMAGE_CACHE_ENABLED:
+        return None
+    
+    cached_path = get_image_cache().get(key, image_format)
+    if cached_path is None:
+        return None
+    
+    try:
+        if output_path:
+            with Image.open(cached_path) as image:
+                image.verify()
+            shutil.copyfile(cached_path, output_path)
+            print(f"Using cached image {cached_path.name}, saved to {output_path}")
+            return True
+        with open(cached_path, "rb") as f:
+            image = Image.open(io.BytesIO(f.read()))
+            image.load()
+        print(f"Using cached image {cached_path.name}")
+        return image
+    except FileNotFoundError:
+        return None
+    except (OSError, SyntaxError) as e:
+        # PIL reports some broken files as SyntaxError
+        print(f"Warning: ignoring unreadable cached image {cached_path.name}: {e}")
+        try:
+            os.remove(cached_path)
+        except OSError:
+            pass
+        return None
+
+def cache_generated_image(key, image_format, image_bytes=None, image_path=None):
+    """Add a new image (bytes or an already saved file) to the image cache"""
+    if not IMAGE_CACHE_ENABLED:
+        return
+    
+    try:
+        if image_path:
+            get_image_cache().put_file(key, image_path, image_format)
+        else:
+            get_image_cache().put(key, image_bytes, image_format)
+    except OSError as e:
+        print(f"Warning: could not cache image: {e}")
+
+def finish_generated_image(key, image_format, result, output_path=None):
+    """Cache a backend's image and turn it into the generate_cover_image return value"""
+    if result is None:
+        return False
+    
+    if output_path:
+        cache_generated_image(key, image_format, image_path=output_path)
+        return True
+    
+    cache_generated_image(key, image_format, image_bytes=result)
+    return Image.open(io.BytesIO(result))
+
+def generate_cover_image(prompt, lora=None, output_path=None, negative_prompt=DEFAULT_NEGATIVE_PROMPT, seed=None):
+    """Generate album cover image with the configured image backend (Stability AI SD 3.5 Large by default)
+
+    Identical requests (same prompt, LoRA, negative prompt and seed) are
+    served from the image cache without calling the backend. Images are
+    streamed straight to output_path without being re-encoded.
+    """
+    backend = get_image_backend()
+    params = build_generation_params(prompt, lora, negative_prompt, seed)
+    key = image_cache_key(backend, params)
+    
+    cached = load_cached_image(key, params["output_format"], output_path)
+    if cached is not None:
+        return cached
+    
+    # Check the backend is configured (e.g. has an API key)
+    error = backend.check_configuration()
+    if error:
+        print(f"ERROR: {error}")
+        return False
+    
+    print(f"Generating with prompt: {prompt}")
     
     try:
         # Send the request
-        response_data = send_generation_request(url, params)
-        
-        # Check if we got a valid response
-        if not response_data:
-            return False
+        result = backend.generate(params, output_path)
+        return finish_generated_image(key, params["output_format"], result, output_path)
             
-        # Extract image data
-        if "image" in response_data:
-            image_base64 = response_data["image"]
-            image_bytes = base64.b64decode(image_base64)
-            
-            # Create image from bytes
-            image = Image.open(io.BytesIO(image_bytes))
-            
-            # Save image if output path is specified
-            if output_path:
-                image.save(output_path)
-                print(f"Image saved to {output_path}")
-                return True
-                
-            return image
-        else:
-            print("No image data found in the response.")
-            print(f"Response structure: {json.dumps(list(response_data.keys()), indent=2)}")
+    except Exception as e:
+        print(f"Error generating image: {e}")
+        if output_path:
             return False
+        # Return a placeholder image
+        return Image.new('RGB', (512, 512), color='#3A506B')
+
+async def generate_cover_image_async(session, prompt, lora=None, output_path=None, negative_prompt=DEFAULT_NEGATIVE_PROMPT, seed=None):
+    """Generate album cover image with the configured image backend on an aiohttp session"""
+    backend = get_image_backend()
+    params = build_generation_params(prompt, lora, negative_prompt, seed)
+    key = image_cache_key(backend, params)
+    
+    cached = load_cached_image(key, params["output_format"], output_path)
+    if cached is not None:
+        return cached
+    
+    # Check the backend is configured (e.g. has an API key)
+    error = backend.check_configuration()
+    if error:
+        print(f"ERROR: {error}")
+        return False
+    
+    print(f"Generating with prompt: {prompt}")
+    
+    try:
+        result = await backend.generate_async(session, params, output_path)
+        return finish_generated_image(key, params["output_format"], result, output_path)
             
     except Exception as e:
         print(f"Error generating image: {e}")
         if output_path:
             return False
         # Return a placeholder image
-        return Image.new('RGB', (512, 512), color='#3A506B')
\ No newline at end of file
+        return Image.new('RGB', (512, 512), color='#3A506B')
+
+def variant_seeds(count, seed=None):
+    """Seeds for count variants: consecutive from seed (reproducible) or random and distinct"""
+    if seed is not None:
+        return [seed + i for i in range(count)]
+    return random.sample(range(1, 1000001), count)
+
+def variant_path(output_path, index):
+    """Output path of one variant, e.g. cover.png -> cover_v2.png"""
+    path = Path(output_path)
+    return path.with_name(f"{path.stem}_v{index + 1}{path.suffix}")
+
+async def generate_cover_variants_async(session, prompt, lora=None, output_paths=None, negative_prompt=DEFAULT_NEGATIVE_PROMPT,
+                                        seeds=None, count=4, concurrency=IMAGE_VARIANT_CONCURRENCY):
+    """Generate the same prompt with several seeds in parallel
+
+    At most concurrency requests are in flight at once. Returns a list of
+    (seed, result) pairs in seed order, where result is what
+    generate_cover_image_async returned for that seed.
+    """
+    if seeds is None:
+        seeds = variant_seeds(count)
+    if output_paths is None:
+        output_paths = [None] * len(seeds)
+    
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    
+    async def generate_one(seed, output_path):
+        async with semaphore:
+            return await generate_cover_image_async(session, prompt, lora, output_path, negative_prompt, seed=seed)
+    
+    results = await asyncio.gather(*(generate_one(seed, path) for seed, path in zip(seeds, output_paths)))
+    return list(zip(seeds, results))
+
+def generate_cover_variants(prompt, lora=None, output_paths=None, negative_prompt=DEFAULT_NEGATIVE_PROMPT,
+                            seeds=None, count=4, concurrency=IMAGE_VARIANT_CONCURRENCY):
+    """Generate several seeds of one prompt in parallel (see generate_cover_variants_async)"""
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            return await generate_cover_variants_async(session, prompt, lora, output_paths, negative_prompt, seeds, count, concurrency)
+    return asyncio.run(run())
+
+def create_contact_sheet(images, output_path=None, columns=None, tile_size=512, padding=8, background="#1B1B1B"):
+    """Arrange images (PIL images or file paths) in a grid
+
+    Saves the sheet to output_path if given, and returns the sheet image.
+    """
+    if not images:
+        return None
+    
+    columns = columns or math.ceil(math.sqrt(len(images)))
+    rows = math.ceil(len(images) / columns)
+    sheet = Image.new(
+        "RGB",
+        (columns * tile_size + (columns + 1) * padding, rows * tile_size + (rows + 1) * padding),
+        color=background
+    )
+    
+    for i, image in enumerate(images):
+        if isinstance(image, Image.Image):
+            tile = image.convert("RGB")
+        else:
+            with Image.open(image) as opened:
+                tile = opened.convert("RGB")
+        tile.thumbnail((tile_size, tile_size))
+        row, column = divmod(i, columns)
+        sheet.paste(tile, (padding + column * (tile_size + padding), padding + row * (tile_size + padding)))
+    
+    if output_path:
+        sheet.save(output_path)
+        print(f"Contact sheet saved to {output_path}")
+    return sheet
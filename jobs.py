@@ -0,0 +1,277 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from config import JOB_DB_PATH, JOB_WORKERS, JOB_QUEUE_LIMIT, JOB_RETENTION, JOB_HEARTBEAT_INTERVAL, JOB_STALE_AFTER
+from generator import generate_cover
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at its limit"""
+
+class JobStore:
+    """Persistent job records (parameters, status and results) in SQLite
+
+    Results are kept on disk so they survive a restart. Several processes
+    can share one store: a job is claimed atomically by one owner, and a
+    running job is only handed to another worker once its owner has stopped
+    sending heartbeats.
+    """
+
+    def __init__(self, path=JOB_DB_PATH):
+        self.path = str(path)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._create_table()
+
+    def _connect(self):
+        """Open a new connection (connections are not shared between threads)"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _create_table(self):
+        """Create the jobs table if it does not exist yet"""
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, "
+                "params TEXT NOT NULL, result TEXT, error TEXT, "
+                "created_at REAL NOT NULL, started_at REAL, finished_at REAL, "
+                "owner TEXT, heartbeat_at REAL)"
+            )
+            # Stores created before jobs had owners
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, column_type in (("owner", "TEXT"), ("heartbeat_at", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+        conn.close()
+
+    def _execute(self, sql, args=()):
+        """Run a write and return the number of rows it changed"""
+        conn = self._connect()
+        try:
+            with conn:
+                return conn.execute(sql, args).rowcount
+        finally:
+            conn.close()
+
+    def _query(self, sql, args=()):
+        conn = self._connect()
+        try:
+            return conn.execute(sql, args).fetchall()
+        finally:
+            conn.close()
+
+    def create(self, kind, params):
+        """Record a new queued job and return its ID"""
+        job_id = uuid.uuid4().hex
+        self._execute(
+            "INSERT INTO jobs (job_id, kind, status, params, created_at) VALUES (?, ?, ?, ?, ?)",
+            (job_id, kind, QUEUED, json.dumps(params), time.time())
+        )
+        return job_id
+
+    def claim(self, job_id, owner):
+        """Mark a queued job as running for owner; False if someone else got it first"""
+        now = time.time()
+        return self._execute(
+            "UPDATE jobs SET status = ?, owner = ?, started_at = ?, heartbeat_at = ? "
+            "WHERE job_id = ? AND status = ?",
+            (RUNNING, owner, now, now, job_id, QUEUED)
+        ) == 1
+
+    def heartbeat(self, owner):
+        """Record that owner is still working on its running jobs"""
+        self._execute(
+            "UPDATE jobs SET heartbeat_at = ? WHERE owner = ? AND status = ?", (time.time(), owner, RUNNING)
+        )
+
+    def mark_finished(self, job_id, result=None, error=None):
+        """Store a job's result, or its error message if it failed"""
+        self._execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE job_id = ?",
+            (FAILED if error is not None else DONE, json.dumps(result) if result is not None else None,
+             error, time.time(), job_id)
+        )
+
+    def requeue_stale(self, stale_after=JOB_STALE_AFTER):
+        """Queue running jobs whose owner stopped sending heartbeats again, returning their IDs"""
+        cutoff = time.time() - stale_after
+        condition = "status = ? AND (heartbeat_at IS NULL OR heartbeat_at < ?)"
+        rows = self._query(f"SELECT job_id FROM jobs WHERE {condition}", (RUNNING, cutoff))
+
+        requeued = []
+        for row in rows:
+            # The condition is checked again so a job that just sent a heartbeat stays with its owner
+            if self._execute(
+                f"UPDATE jobs SET status = ?, owner = NULL, started_at = NULL WHERE job_id = ? AND {condition}",
+                (QUEUED, row["job_id"], RUNNING, cutoff)
+            ):
+                requeued.append(row["job_id"])
+        return requeued
+
+    def get(self, job_id):
+        """Get a job as a dict, or None if it does not exist"""
+        rows = self._query("SELECT * FROM jobs WHERE job_id = ?", (job_id,))
+        if not rows:
+            return None
+
+        job = dict(rows[0])
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        if job["status"] == QUEUED:
+            job["queue_position"] = self._query(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < ?", (QUEUED, job["created_at"])
+            )[0][0]
+        return job
+
+    def queued(self):
+        """IDs of queued jobs, oldest first"""
+        rows = self._query("SELECT job_id FROM jobs WHERE status = ? ORDER BY created_at", (QUEUED,))
+        return [row["job_id"] for row in rows]
+
+    def counts(self):
+        """Number of jobs in each state"""
+        rows = self._query("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")
+        return {row["status"]: row["n"] for row in rows}
+
+    def purge_finished(self, older_than=JOB_RETENTION):
+        """Delete finished jobs older than the given number of seconds"""
+        self._execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+            (DONE, FAILED, time.time() - older_than)
+        )
+
+class JobQueue:
+    """Bounded pool of worker threads running jobs from a JobStore
+
+    At most `limit` jobs wait in the queue; further submissions raise
+    QueueFullError so callers can shed load instead of piling up work.
+    Queues in several processes may share a store; each job runs once.
+    """
+
+    def __init__(self, store, handlers, workers=JOB_WORKERS, limit=JOB_QUEUE_LIMIT,
+                 heartbeat_interval=JOB_HEARTBEAT_INTERVAL, stale_after=JOB_STALE_AFTER):
+        self.store = store
+        self.handlers = handlers
+        self.workers = workers
+        self.limit = limit
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._running = 0
+        self._started = False
+
+    def start(self):
+        """Start the workers and pick up jobs that are waiting or whose worker died"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+
+        self.store.requeue_stale(self.stale_after)
+        # Jobs another live process queued are claimed by whichever worker gets there first
+        for job_id in self.store.queued():
+            self._queue.put(job_id)
+
+        for i in range(self.workers):
+            threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True).start()
+        threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True).start()
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(self.heartbeat_interval)
+            try:
+                self.store.heartbeat(self.owner)
+                for job_id in self.store.requeue_stale(self.stale_after):
+                    print(f"Job {job_id} lost its worker, queued again")
+                    self._queue.put(job_id)
+            except Exception as e:
+                print(f"Warning: job heartbeat failed: {e}")
+
+    def submit(self, kind, params):
+        """Queue a job and return its ID without waiting for it"""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        with self._lock:
+            if self._queue.qsize() >= self.limit:
+                raise QueueFullError(f"Job queue is full ({self.limit} jobs waiting)")
+            job_id = self.store.create(kind, params)
+            self._queue.put(job_id)
+        return job_id
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job_id):
+        job = self.store.get(job_id)
+        if job is None or job["status"] != QUEUED or not self.store.claim(job_id, self.owner):
+            return
+
+        with self._lock:
+            self._running += 1
+        print(f"Job {job_id} started ({job['kind']})")
+
+        try:
+            result = self.handlers[job["kind"]](**job["params"])
+            if isinstance(result, dict) and "error" in result:
+                self.store.mark_finished(job_id, error=result["error"] or "Generation failed")
+            else:
+                self.store.mark_finished(job_id, result=result)
+            print(f"Job {job_id} finished")
+        except Exception as e:
+            print(f"Job {job_id} failed: {e!r}")
+            self.store.mark_finished(job_id, error=str(e) or type(e).__name__)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def stats(self):
+        """Queue depth and worker utilization"""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "running": self._running,
+                "queued": self._queue.qsize(),
+                "limit": self.limit
+            }
+
+# Functions run by each kind of job; parameters are passed as keyword arguments
+JOB_HANDLERS = {
+    "generate": generate_cover
+}
+
+# Shared queue, created and started on first use
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """Get the shared job queue, starting its workers on first use"""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            store = JobStore()
+            store.purge_finished()
+            _job_queue = JobQueue(store, JOB_HANDLERS)
+            _job_queue.start()
+        return _job_queue
@@ -0,0 +1,102 @@
+import argparse
+import base64
+import json
+import random
+import time
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from config import FAKE_IMAGE_LATENCY, FAKE_IMAGE_ERROR_RATE, FAKE_IMAGE_SIZE, LOCAL_IMAGE_BACKEND_URL
+from image_backends import render_placeholder_image
+
+def parse_form(content_type, body):
+    """Parse a multipart/form-data body into a dict of string fields"""
+    message = BytesParser(policy=policy.default).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + body
+    )
+    fields = {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        if name:
+            fields[name] = part.get_content()
+    return fields
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answer Stability-style generation requests with deterministic images
+
+    Each request waits `latency` seconds and then fails with probability
+    `error_rate`. Otherwise it returns the raw image (Accept: image/*) or
+    base64 JSON like the real API.
+    """
+    protocol_version = "HTTP/1.1"
+    latency = FAKE_IMAGE_LATENCY
+    error_rate = FAKE_IMAGE_ERROR_RATE
+    size = FAKE_IMAGE_SIZE
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        params = parse_form(self.headers.get("Content-Type", ""), body)
+
+        time.sleep(self.latency)
+        if random.random() < self.error_rate:
+            self._send(500, "application/json", json.dumps({
+                "name": "internal_error",
+                "errors": ["Simulated failure from the local image server"]
+            }).encode("utf-8"))
+            return
+
+        image_format = params.get("output_format", "png")
+        image_bytes = render_placeholder_image(params, self.size)
+        if self.headers.get("Accept", "").startswith("image/"):
+            self._send(200, f"image/{image_format}", image_bytes)
+        else:
+            self._send(200, "application/json", json.dumps({
+                "image": base64.b64encode(image_bytes).decode("ascii"),
+                "seed": params.get("seed"),
+                "finish_reason": "SUCCESS"
+            }).encode("utf-8"))
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # One line per request would swamp the output of a load test
+        pass
+
+def make_server(host="127.0.0.1", port=7860, latency=FAKE_IMAGE_LATENCY, error_rate=FAKE_IMAGE_ERROR_RATE, size=FAKE_IMAGE_SIZE):
+    """Create a threaded stand-in server (call serve_forever() to run it)"""
+    handler = type("ConfiguredStandInHandler", (StandInHandler,), {
+        "latency": latency,
+        "error_rate": error_rate,
+        "size": size
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+def main():
+    default_url = urlparse(LOCAL_IMAGE_BACKEND_URL)
+    parser = argparse.ArgumentParser(description="Local stand-in for the Stability image API")
+    parser.add_argument("--host", default=default_url.hostname or "127.0.0.1")
+    parser.add_argument("--port", type=int, default=default_url.port or 7860)
+    parser.add_argument("--latency", type=float, default=FAKE_IMAGE_LATENCY, help="Seconds before each response")
+    parser.add_argument("--error-rate", type=float, default=FAKE_IMAGE_ERROR_RATE, help="Share of requests that fail (0-1)")
+    parser.add_argument("--size", type=int, default=FAKE_IMAGE_SIZE, help="Width and height of generated images")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency, args.error_rate, args.size)
+    print(f"Local image server on http://{args.host}:{args.port} "
+          f"(latency {args.latency}s, error rate {args.error_rate:.0%}, {args.size}px)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
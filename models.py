@@ -1,9 +1,60 @@
 from collections import Counter
 from dataclasses import dataclass, field
+from functools import lru_cache
+from itertools import islice
 from typing import List, Dict, Optional, Any
 import json
+import re
 
-@dataclass
+# Simple genre-based mood classification
+MOOD_KEYWORDS = {
+    "euphoric": ["edm", "dance", "house", "electronic", "pop", "party"],
+    "energetic": ["rock", "metal", "punk", "trap", "dubstep"],
+    "peaceful": ["ambient", "classical", "chill", "lo-fi", "instrumental"],
+    "melancholic": ["sad", "slow", "ballad", "emotional", "soul", "blues"],
+    "upbeat": ["happy", "funk", "disco", "pop", "tropical"],
+    "relaxed": ["acoustic", "folk", "indie", "soft", "ambient"]
+}
+
+# Genres used to calculate energy level
+LOW_ENERGY_KEYWORDS = ["ambient", "classical", "chill", "lo-fi", "acoustic", "folk"]
+HIGH_ENERGY_KEYWORDS = ["rock", "metal", "edm", "dance", "trap", "dubstep", "house"]
+
+def keyword_matcher(keywords):
+    """Build a function returning the set of keywords found in a text, like testing each with `in`
+
+    One lookahead pattern reports the longest keyword starting at every
+    position, so overlapping keywords are all found. Keywords that are a
+    prefix of the one found at a position also occur there, so they are
+    added from a table built once here.
+    """
+    ordered = sorted(set(keywords), key=len, reverse=True)
+    pattern = re.compile("(?=(" + "|".join(re.escape(kw) for kw in ordered) + "))")
+    prefixes = {kw: {other for other in ordered if kw.startswith(other)} for kw in ordered}
+    
+    def find(text):
+        found = set()
+        for match in pattern.findall(text):
+            found |= prefixes[match]
+        return found
+    return find
+
+# Matcher for every mood and energy keyword, built once at import
+_find_keywords = keyword_matcher(
+    {kw for kws in MOOD_KEYWORDS.values() for kw in kws} | set(LOW_ENERGY_KEYWORDS) | set(HIGH_ENERGY_KEYWORDS)
+)
+
+@lru_cache(maxsize=65536)
+def classify_genre(genre):
+    """Classify one genre as (moods, is_low_energy, is_high_energy), memoized per genre."""
+    keywords = _find_keywords(genre.lower())
+    if not keywords:
+        return (), False, False
+    
+    moods = tuple(mood for mood, mood_kws in MOOD_KEYWORDS.items() if keywords.intersection(mood_kws))
+    return moods, bool(keywords.intersection(LOW_ENERGY_KEYWORDS)), bool(keywords.intersection(HIGH_ENERGY_KEYWORDS))
+
+@dataclass(slots=True)
 class LoraModel:
     """LoRA model information"""
     name: str
@@ -41,57 +92,91 @@ class LoraModel:
             strength=data.get("strength", 0.7)
         )
 
-@dataclass
+@dataclass(slots=True)
 class GenreAnalysis:
-    top_genres: List[str] = field(default_factory=list)
-    all_genres: List[str] = field(default_factory=list)
-    genres_with_counts: List[tuple] = field(default_factory=list)
+    # Genre -> occurrence count, ordered from most to least frequent
+    genre_counts: Dict[str, int] = field(default_factory=dict)
     mood: str = "balanced"
     energy_level: str = "balanced"
+    # Derived values computed once per set of counts (see _cached)
+    _derived: Dict[Any, Any] = field(default_factory=dict, init=False, repr=False, compare=False)
+    
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        # Replacing the counts invalidates everything derived from them
+        if name == "genre_counts":
+            object.__setattr__(self, "_derived", {})
+    
+    def _cached(self, key, compute):
+        """Return a derived value, computing it on first use."""
+        if key not in self._derived:
+            self._derived[key] = compute()
+        return self._derived[key]
+    
+    def invalidate(self):
+        """Drop cached derived values after changing genre_counts in place."""
+        self._derived.clear()
+    
+    @staticmethod
+    def rank_counts(genre_counts: Dict[str, int]) -> Dict[str, int]:
+        """Order counts by frequency, breaking ties by name so the order never
+        depends on the order in which counts were accumulated."""
+        return dict(sorted(genre_counts.items(), key=lambda x: (-x[1], x[0])))
+    
+    @property
+    def top_genres(self) -> List[str]:
+        """The 10 most frequent genres."""
+        return self._cached("top_genres", lambda: list(islice(self.genre_counts, 10)))
+    
+    @property
+    def genres_with_counts(self) -> List[tuple]:
+        """The 20 most frequent genres with their counts."""
+        return list(islice(self.genre_counts.items(), 20))
+    
+    @property
+    def total_count(self) -> int:
+        """Total number of genre occurrences."""
+        return self._cached("total_count", lambda: sum(self.genre_counts.values()))
+    
+    @property
+    def genres_lower(self) -> List[str]:
+        """The top genres in lowercase."""
+        return self._cached("genres_lower", lambda: [g.lower() for g in self.top_genres])
     
     @classmethod
     def from_genre_list(cls, genres: List[str]):
         """Create a GenreAnalysis object from a list of genres."""
-        if not genres:
+        return cls.from_genre_counts(Counter(genres))
+    
+    @classmethod
+    def from_genre_counts(cls, genre_counts: Dict[str, int]):
+        """Create a GenreAnalysis object from genre occurrence counts."""
+        if not genre_counts:
             return cls()
         
-        # Count and sort genres by frequency
-        genre_counter = Counter(genres)
-        top_genres = [genre for genre, _ in genre_counter.most_common(10)]
-        genres_with_counts = genre_counter.most_common(20)
-        
         # Determine overall mood based on genres
         mood = "balanced"  # Default mood
         
-        # Simple genre-based mood classification
-        mood_keywords = {
-            "euphoric": ["edm", "dance", "house", "electronic", "pop", "party"],
-            "energetic": ["rock", "metal", "punk", "trap", "dubstep"],
-            "peaceful": ["ambient", "classical", "chill", "lo-fi", "instrumental"],
-            "melancholic": ["sad", "slow", "ballad", "emotional", "soul", "blues"],
-            "upbeat": ["happy", "funk", "disco", "pop", "tropical"],
-            "relaxed": ["acoustic", "folk", "indie", "soft", "ambient"]
-        }
-        
-        # Count genre matches for each mood
-        mood_scores = {mood: 0 for mood in mood_keywords}
+        # Count genre matches for each mood, and low/high energy matches,
+        # classifying each unique genre once and weighting it by its count
+        mood_scores = {mood: 0 for mood in MOOD_KEYWORDS}
+        low_count = 0
+        high_count = 0
         
-        for genre in genres:
-            for mood_name, keywords in mood_keywords.items():
-                if any(keyword in genre.lower() for keyword in keywords):
-                    mood_scores[mood_name] += 1
+        for genre, count in genre_counts.items():
+            moods, is_low, is_high = classify_genre(genre)
+            for mood_name in moods:
+                mood_scores[mood_name] += count
+            if is_low:
+                low_count += count
+            if is_high:
+                high_count += count
         
         # Pick highest scoring mood if we have matches
         if any(mood_scores.values()):
             mood = max(mood_scores.items(), key=lambda x: x[1])[0]
         
         # Calculate energy level based on genres
-        low_energy_genres = ["ambient", "classical", "chill", "lo-fi", "acoustic", "folk"]
-        high_energy_genres = ["rock", "metal", "edm", "dance", "trap", "dubstep", "house"]
-        
-        low_count = sum(1 for genre in genres if any(keyword in genre.lower() for keyword in low_energy_genres))
-        high_count = sum(1 for genre in genres if any(keyword in genre.lower() for keyword in high_energy_genres))
-        
         if high_count > low_count:
             energy_level = "energetic"
         elif low_count > high_count:
@@ -100,17 +185,47 @@ class GenreAnalysis:
             energy_level = "balanced"
         
         return cls(
-            top_genres=top_genres,
-            all_genres=genres,
-            genres_with_counts=genres_with_counts,
+            genre_counts=cls.rank_counts(genre_counts),
             mood=mood,
             energy_level=energy_level
         )
     
+    @classmethod
+    def merge_all(cls, analyses):
+        """Merge many partial analyses, summing their counts once.
+        
+        Mood and energy are derived from the merged counts, never combined from
+        the partial moods, so the result equals analyzing all genres at once.
+        The empty GenreAnalysis() is the identity.
+        """
+        merged = Counter()
+        for analysis in analyses:
+            merged.update(analysis.genre_counts)
+        return cls.from_genre_counts(merged)
+    
+    def merge(self, *others):
+        """Merge this analysis with others into a new GenreAnalysis."""
+        return self.merge_all((self, *others))
+    
+    def __add__(self, other):
+        if not isinstance(other, GenreAnalysis):
+            return NotImplemented
+        return self.merge(other)
+    
+    def __radd__(self, other):
+        # Lets sum(analyses) start from its default 0
+        if other == 0:
+            return self
+        return NotImplemented
+    
     def get_style_elements(self):
         """Get style elements based on genres."""
+        return self._cached("style_elements", self._compute_style_elements)
+    
+    def _compute_style_elements(self):
+        """Derive style elements from the top genres."""
         style_elements = []
-        genres_lower = [g.lower() for g in self.top_genres]
+        genres_lower = self.genres_lower
         
         if any("rock" in g for g in genres_lower) or any("metal" in g for g in genres_lower):
             style_elements.append("dramatic lighting, bold contrasts")
@@ -127,25 +242,31 @@ class GenreAnalysis:
     
     def get_percentages(self, max_genres=5):
         """Calculate percentage distribution of genres."""
-        if not self.all_genres:
+        return self._cached(("percentages", max_genres), lambda: self._compute_percentages(max_genres))
+    
+    def get_chart_data(self, max_genres=8):
+        """Labels and values of the most frequent genres for the genre chart."""
+        return self._cached(("chart_data", max_genres), lambda: (
+            list(islice(self.genre_counts, max_genres)),
+            list(islice(self.genre_counts.values(), max_genres))
+        ))
+    
+    def _compute_percentages(self, max_genres):
+        """Derive the percentage distribution of the top genres."""
+        if not self.genre_counts:
             return []
         
-        # Count genres
-        genre_counter = Counter(self.all_genres)
-        total_count = sum(genre_counter.values())
-        
-        # Sort and get percentages
-        sorted_genres = genre_counter.most_common(max_genres)
+        total_count = self.total_count
         
         # Calculate percentages
         genre_percentages = [
             {"name": genre, "percentage": round((count / total_count) * 100)} 
-            for genre, count in sorted_genres
+            for genre, count in islice(self.genre_counts.items(), max_genres)
         ]
         
         return genre_percentages
 
-@dataclass
+@dataclass(slots=True)
 class PlaylistData:
     item_name: str = "Unknown Playlist"
     track_names: List[str] = field(default_factory=list)
@@ -159,7 +280,7 @@ class PlaylistData:
             "item_name": self.item_name,
             "track_names": self.track_names,
             "genres": self.genre_analysis.top_genres,
-            "all_genres": self.genre_analysis.all_genres,
+            "genre_counts": self.genre_analysis.genre_counts,
             "genres_with_counts": self.genre_analysis.genres_with_counts,
             "mood_descriptor": self.genre_analysis.mood,
             "energy_level": self.genre_analysis.energy_level,
@@ -171,10 +292,13 @@ class PlaylistData:
     @classmethod
     def from_dict(cls, data):
         """Create PlaylistData from dictionary."""
+        # Older data stored every genre occurrence in all_genres instead of counts
+        genre_counts = data.get("genre_counts")
+        if genre_counts is None:
+            genre_counts = Counter(data.get("all_genres", []))
+        
         genre_analysis = GenreAnalysis(
-            top_genres=data.get("genres", []),
-            all_genres=data.get("all_genres", []),
-            genres_with_counts=data.get("genres_with_counts", []),
+            genre_counts=GenreAnalysis.rank_counts(genre_counts),
             mood=data.get("mood_descriptor", "balanced"),
             energy_level=data.get("energy_level", "balanced")
         )
@@ -187,7 +311,7 @@ class PlaylistData:
             found_genres=data.get("found_genres", False)
         )
 
-@dataclass
+@dataclass(slots=True)
 class GenerationResult:
     title: str
     output_path: str
@@ -198,6 +322,8 @@ class GenerationResult:
     lora_url: str = ""   # URL for link-based LoRAs
     data_file: str = ""
     timestamp: str = ""
+    variants: List[Dict[str, Any]] = field(default_factory=list)  # {"seed", "output_path"} per variant
+    contact_sheet: str = ""
     
     def to_dict(self):
         """Convert to dictionary."""
@@ -206,10 +332,11 @@ class GenerationResult:
             "output_path": self.output_path,
             "item_name": self.playlist_data.item_name,
             "genres": self.playlist_data.genre_analysis.top_genres,
-            "all_genres": self.playlist_data.genre_analysis.all_genres,
+            "genre_counts": self.playlist_data.genre_analysis.genre_counts,
             "style_elements": self.playlist_data.genre_analysis.get_style_elements(),
             "mood": self.user_mood if self.user_mood else self.playlist_data.genre_analysis.mood,
             "energy_level": self.playlist_data.genre_analysis.energy_level,
+            "genre_percentages": self.playlist_data.genre_analysis.get_percentages(max_genres=5),
             "timestamp": self.timestamp,
             "spotify_url": self.playlist_data.spotify_url,
             "data_file": self.data_file
@@ -221,5 +348,11 @@ class GenerationResult:
             result["lora_type"] = self.lora_type
             if self.lora_url:
                 result["lora_url"] = self.lora_url
+        
+        # Add variants if several seeds were generated
+        if self.variants:
+            result["variants"] = self.variants
+            if self.contact_sheet:
+                result["contact_sheet"] = self.contact_sheet
                 
         return result
\ No newline at end of file
@@ -0,0 +1,89 @@
+import random
+import re
+
+# Adjectives and nouns for each mood of models.MOOD_KEYWORDS, plus the default "balanced"
+MOOD_WORDS = {
+    "euphoric": (
+        ["Radiant", "Electric", "Weightless", "Golden", "Soaring", "Brilliant"],
+        ["Heights", "Fireworks", "Skylines", "Pulse", "Rapture", "Daybreak"]
+    ),
+    "energetic": (
+        ["Restless", "Burning", "Iron", "Reckless", "Thunderous", "Untamed"],
+        ["Engines", "Static", "Wildfire", "Voltage", "Riot", "Storms"]
+    ),
+    "peaceful": (
+        ["Quiet", "Still", "Gentle", "Drifting", "Silver", "Slow"],
+        ["Tides", "Meadows", "Mornings", "Snowfall", "Harbors", "Breath"]
+    ),
+    "melancholic": (
+        ["Faded", "Distant", "Hollow", "Lonely", "Grey", "Unsent"],
+        ["Letters", "Rain", "Echoes", "Winters", "Shadows", "Goodbyes"]
+    ),
+    "upbeat": (
+        ["Bright", "Lucky", "Sunlit", "Dizzy", "Sugar", "Bouncing"],
+        ["Summers", "Parades", "Sunshine", "Rollercoasters", "Confetti", "Weekends"]
+    ),
+    "relaxed": (
+        ["Warm", "Easy", "Amber", "Lazy", "Soft", "Open"],
+        ["Porches", "Afternoons", "Roads", "Fields", "Embers", "Sundays"]
+    ),
+    "balanced": (
+        ["Hidden", "Painted", "Paper", "Crystal", "Velvet", "Wandering"],
+        ["Rooms", "Maps", "Signals", "Horizons", "Gardens", "Stories"]
+    )
+}
+
+# Title shapes filled in with mood words and a word from the playlist's genres
+TEMPLATES = [
+    "{adj} {noun}",
+    "The {adj} {noun}",
+    "{noun} of {adj} {noun2}",
+    "{adj} {genre} {noun}",
+    "Songs for {adj} {noun}",
+    "{noun} and {noun2}",
+    "After the {noun}",
+    "{genre} {noun}",
+    "{adj} {noun} {genre}"
+]
+
+# Genre words too generic to appear in a title
+GENERIC_GENRE_WORDS = {"music", "pop", "alternative", "contemporary", "modern", "new"}
+
+def _user_mood_words(mood):
+    """Capitalized words of a free-text mood that can serve as adjectives"""
+    return [word.capitalize() for word in re.findall(r"[A-Za-z]{4,}", mood)][:3]
+
+def _genre_words(genres):
+    """Capitalized words from the top genres, most frequent genre first"""
+    words = []
+    for genre in genres[:5]:
+        for word in re.findall(r"[A-Za-z]{3,}", genre):
+            word = word.capitalize()
+            if word.lower() not in GENERIC_GENRE_WORDS and word not in words:
+                words.append(word)
+    return words or ["Midnight"]
+
+def generate_offline_titles(playlist_data, mood="", count=5, rng=None):
+    """Build up to `count` different titles from genres and mood without any API call"""
+    rng = rng or random.Random()
+    mood = mood or ""
+    mood_descriptor = playlist_data.get("mood_descriptor", "balanced")
+    adjectives, nouns = MOOD_WORDS.get(mood.strip().lower(), MOOD_WORDS.get(mood_descriptor, MOOD_WORDS["balanced"]))
+    adjectives = adjectives + _user_mood_words(mood)
+    genres = _genre_words(playlist_data.get("genres", []))
+
+    titles = []
+    for attempt in range(count * 10):
+        noun, noun2 = rng.sample(nouns, 2)
+        title = rng.choice(TEMPLATES).format(
+            adj=rng.choice(adjectives), noun=noun, noun2=noun2, genre=rng.choice(genres)
+        )[:50]
+        if title not in titles:
+            titles.append(title)
+        if len(titles) >= count:
+            break
+    return titles
+
+def generate_offline_title(playlist_data, mood=""):
+    """One title from genres and mood, for when Gemini is unavailable"""
+    return generate_offline_titles(playlist_data, mood, count=1)[0]
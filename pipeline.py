@@ -0,0 +1,116 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional, Tuple
+
+from config import PIPELINE_THREAD_WORKERS
+
+# Threads of plain-function stages. asyncio.run waits for the loop's default
+# executor when it closes, so a timed-out stage running there would still hold
+# up a synchronous caller; threads of this pool are left to finish on their own
+_stage_executor = ThreadPoolExecutor(max_workers=PIPELINE_THREAD_WORKERS, thread_name_prefix="pipeline-stage")
+
+class PipelineAbort(Exception):
+    """Raised by a stage to stop the whole pipeline with a user-facing error message"""
+
+@dataclass(slots=True)
+class Stage:
+    """One step of a pipeline
+
+    func receives the results of earlier stages as a dict keyed by stage
+    name. It may be a coroutine function, or a plain function, which runs in
+    a worker thread. A stage starts as soon as every stage in depends_on
+    has finished. If a required stage fails or times out, the pipeline
+    stops. An optional stage that fails gets `default` as its result.
+    """
+    name: str
+    func: Callable[[dict], Any]
+    depends_on: Tuple[str, ...] = ()
+    timeout: Optional[float] = None
+    required: bool = True
+    default: Any = None
+
+@dataclass(slots=True)
+class PipelineRun:
+    """Results and per-stage wall-clock timings of a pipeline run"""
+    results: dict = field(default_factory=dict)
+    timings: dict = field(default_factory=dict)
+
+async def run_in_thread(func, *args):
+    """Await func(*args) run in a stage worker thread
+
+    Threads cannot be interrupted: if the awaiting task is cancelled or
+    times out, the result is dropped and the thread runs to completion
+    without anyone waiting for it.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_stage_executor, func, *args)
+
+async def _run_stage(stage, results):
+    if asyncio.iscoroutinefunction(stage.func):
+        call = stage.func(results)
+    else:
+        call = run_in_thread(stage.func, results)
+    return await asyncio.wait_for(call, stage.timeout)
+
+async def run_stages(stages):
+    """Run stages as a dependency graph, each as soon as its inputs are ready
+
+    Returns a PipelineRun. Raises PipelineAbort when a required stage fails,
+    after cancelling the stages that are still running.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        for dependency in stage.depends_on:
+            if dependency not in by_name:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dependency}'")
+
+    run = PipelineRun()
+    tasks = {}
+
+    async def execute(stage):
+        # Dependencies are awaited through their tasks, so each stage runs once
+        for dependency in stage.depends_on:
+            await tasks[dependency]
+
+        started = time.perf_counter()
+        try:
+            result = await _run_stage(stage, run.results)
+        except asyncio.TimeoutError:
+            if stage.required:
+                raise PipelineAbort(f"{stage.name} timed out after {stage.timeout:g}s")
+            print(f"Warning: stage '{stage.name}' timed out after {stage.timeout:g}s")
+            result = stage.default
+        except PipelineAbort:
+            raise
+        except Exception as e:
+            if stage.required:
+                raise PipelineAbort(f"{stage.name} failed: {e}") from e
+            print(f"Warning: stage '{stage.name}' failed: {e}")
+            result = stage.default
+        finally:
+            run.timings[stage.name] = round(time.perf_counter() - started, 3)
+
+        run.results[stage.name] = result
+        return result
+
+    # Tasks are created in a cycle-free order so every dependency exists first
+    pending = list(stages)
+    while pending:
+        ready = [stage for stage in pending if all(d in tasks for d in stage.depends_on)]
+        if not ready:
+            raise ValueError("Pipeline stages contain a dependency cycle")
+        for stage in ready:
+            tasks[stage.name] = asyncio.ensure_future(execute(stage))
+            pending.remove(stage)
+
+    try:
+        await asyncio.gather(*tasks.values())
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
+
+    return run
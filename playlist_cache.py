@@ -0,0 +1,77 @@
+import json
+import sqlite3
+import time
+from pathlib import Path
+from config import PLAYLIST_CACHE_PATH
+from models import PlaylistData
+from serialization import pack_playlist_data, unpack_playlist_data
+
+class PlaylistDataCache:
+    """Persistent cache of extracted PlaylistData keyed by item and snapshot_id
+
+    Playlists are stored with their snapshot_id and only reused while it is
+    unchanged. Albums are immutable, so they are stored with an empty
+    snapshot and reused indefinitely.
+    """
+
+    def __init__(self, path=PLAYLIST_CACHE_PATH):
+        self.path = str(path)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._create_table()
+
+    def _connect(self):
+        """Open a new connection (connections are not shared between threads)"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _create_table(self):
+        """Create the cache table if it does not exist yet"""
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS playlist_data ("
+                "item_key TEXT PRIMARY KEY, snapshot_id TEXT NOT NULL, "
+                "data TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+        conn.close()
+
+    def get(self, item_key, snapshot_id=""):
+        """Get the cached PlaylistData for an item, or None if missing or stale"""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT data FROM playlist_data WHERE item_key = ? AND snapshot_id = ?",
+                (item_key, snapshot_id or "")
+            ).fetchone()
+        finally:
+            conn.close()
+
+        if not row:
+            return None
+        if isinstance(row[0], str):
+            # Entries written before the binary codec hold a JSON dict
+            return PlaylistData.from_dict(json.loads(row[0]))
+        return unpack_playlist_data(row[0])
+
+    def set(self, item_key, playlist_data, snapshot_id=""):
+        """Store PlaylistData for an item, replacing any older snapshot"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO playlist_data (item_key, snapshot_id, data, updated_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (item_key, snapshot_id or "", pack_playlist_data(playlist_data), time.time())
+                )
+        finally:
+            conn.close()
+
+# Shared cache instance, created on first use
+_playlist_cache = None
+
+def get_playlist_cache():
+    """Get the shared playlist data cache"""
+    global _playlist_cache
+    if _playlist_cache is None:
+        _playlist_cache = PlaylistDataCache()
+    return _playlist_cache
@@ -0,0 +1,153 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+# Circuit breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+class CircuitBreaker:
+    """Stop calling a failing service for a while
+
+    After `failure_threshold` failures in a row the breaker opens and
+    allow() returns False for `cooldown` seconds. After that, one trial call
+    is let through (half-open). Its success closes the breaker and its
+    failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=3, cooldown=60.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may be made now"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    print(f"Circuit breaker opened after {self.failures} failures")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "failures": self.failures}
+
+class LatencyTracker:
+    """Latencies of the most recent successful calls"""
+
+    def __init__(self, window=200, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p):
+        """The p-th percentile of recent latencies, or None until there are enough samples"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+def hedged_call(executor, call, budget, hedge_delay=None):
+    """Run call(timeout) on an executor and return the first successful result
+
+    A second copy of the call starts once the first has run for hedge_delay
+    seconds (or as soon as it fails). Raises TimeoutError when nothing
+    succeeded within `budget` seconds, or the last error if every call failed.
+    Calls still running at that point finish in the background.
+    """
+    started = time.monotonic()
+    deadline = started + budget
+    hedge_at = started + hedge_delay if hedge_delay is not None else None
+    pending = {executor.submit(call, budget)}
+    error = None
+
+    while pending:
+        wake = deadline if hedge_at is None else min(deadline, hedge_at)
+        done, pending = wait(pending, timeout=max(0.0, wake - time.monotonic()), return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                return future.result()
+            except Exception as e:
+                error = e
+
+        now = time.monotonic()
+        if now >= deadline:
+            raise TimeoutError(f"No response within {budget:g}s")
+        if hedge_at is not None and (now >= hedge_at or not pending):
+            pending.add(executor.submit(call, deadline - now))
+            hedge_at = None
+
+    raise error
+
+async def hedged_call_async(call, budget, hedge_delay=None):
+    """Await coroutine call(timeout), hedged like hedged_call
+
+    Calls still running when a result is returned or the budget runs out
+    are cancelled.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + budget
+    hedge_at = started + hedge_delay if hedge_delay is not None else None
+    pending = {asyncio.ensure_future(call(budget))}
+    error = None
+
+    try:
+        while pending:
+            wake = deadline if hedge_at is None else min(deadline, hedge_at)
+            done, pending = await asyncio.wait(pending, timeout=max(0.0, wake - loop.time()), return_when=asyncio.FIRST_COMPLETED)
+            # Every finished call is inspected so no exception goes unretrieved
+            results = []
+            for task in done:
+                if task.exception() is None:
+                    results.append(task.result())
+                else:
+                    error = task.exception()
+            if results:
+                return results[0]
+
+            now = loop.time()
+            if now >= deadline:
+                raise TimeoutError(f"No response within {budget:g}s")
+            if hedge_at is not None and (now >= hedge_at or not pending):
+                pending.add(asyncio.ensure_future(call(deadline - now)))
+                hedge_at = None
+
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+            # A call may finish before the cancellation lands; its error is not needed
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
@@ -0,0 +1,101 @@
+import json
+from pathlib import Path
+
+import msgpack
+
+from models import GenreAnalysis, PlaylistData
+
+# Version 1: JSON with every genre occurrence in "all_genres" and no version field
+# Version 2: genre counts in "genre_counts"
+SCHEMA_VERSION = 2
+
+# File extension for each supported format
+FORMAT_EXTENSIONS = {
+    "msgpack": ".msgpack",
+    "json": ".json"
+}
+
+def upgrade_record(data):
+    """Bring a decoded history/playlist dict up to the current schema version"""
+    version = data.get("schema_version", 1)
+
+    if version < 2:
+        data = dict(data)
+        all_genres = data.pop("all_genres", None)
+        if "genre_counts" not in data and all_genres is not None:
+            genre_counts = {}
+            for genre in all_genres:
+                genre_counts[genre] = genre_counts.get(genre, 0) + 1
+            data["genre_counts"] = GenreAnalysis.rank_counts(genre_counts)
+
+    data["schema_version"] = SCHEMA_VERSION
+    return data
+
+def dumps(data, fmt="msgpack"):
+    """Encode a dict to bytes in the given format, stamping the schema version"""
+    data = {**data, "schema_version": SCHEMA_VERSION}
+    if fmt == "msgpack":
+        return msgpack.packb(data, use_bin_type=True)
+    if fmt == "json":
+        # Compact separators: no indentation or padding to write and parse
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    raise ValueError(f"Unknown serialization format: {fmt}")
+
+def loads(raw, fmt="msgpack"):
+    """Decode bytes in the given format into a dict at the current schema version"""
+    if fmt == "msgpack":
+        data = msgpack.unpackb(raw, raw=False, strict_map_key=False)
+    elif fmt == "json":
+        data = json.loads(raw)
+    else:
+        raise ValueError(f"Unknown serialization format: {fmt}")
+    return upgrade_record(data)
+
+def format_for_path(path):
+    """Pick the format from a file's extension"""
+    suffix = Path(path).suffix.lower()
+    for fmt, extension in FORMAT_EXTENSIONS.items():
+        if suffix == extension:
+            return fmt
+    raise ValueError(f"Unknown history file type: {suffix}")
+
+def save(data, path):
+    """Write a dict to a file, in the format given by its extension"""
+    with open(path, "wb") as f:
+        f.write(dumps(data, format_for_path(path)))
+
+def load(path):
+    """Read a dict from a history file of any supported format or schema version"""
+    with open(path, "rb") as f:
+        return loads(f.read(), format_for_path(path))
+
+def pack_playlist_data(playlist_data):
+    """Encode PlaylistData as a compact positional msgpack record"""
+    analysis = playlist_data.genre_analysis
+    return msgpack.packb([
+        SCHEMA_VERSION,
+        playlist_data.item_name,
+        playlist_data.track_names,
+        analysis.genre_counts,
+        analysis.mood,
+        analysis.energy_level,
+        playlist_data.spotify_url,
+        playlist_data.found_genres
+    ], use_bin_type=True)
+
+def unpack_playlist_data(raw):
+    """Decode a record written by pack_playlist_data without going through from_dict"""
+    record = msgpack.unpackb(raw, raw=False, strict_map_key=False)
+    version = record[0]
+    if version != SCHEMA_VERSION:
+        raise ValueError(f"Unsupported playlist record version: {version}")
+
+    _, item_name, track_names, genre_counts, mood, energy_level, spotify_url, found_genres = record
+    return PlaylistData(
+        item_name=item_name,
+        track_names=track_names,
+        # Counts were ranked when packed and msgpack keeps map order
+        genre_analysis=GenreAnalysis(genre_counts=genre_counts, mood=mood, energy_level=energy_level),
+        spotify_url=spotify_url,
+        found_genres=found_genres
+    )
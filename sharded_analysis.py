@@ -0,0 +1,59 @@
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import spotify_client
+from models import GenreAnalysis
+from rate_limit import TokenBucket
+from spotify_client import ARTIST_BATCH_SIZE, collect_tracks, get_artist_genres, open_spotify_item
+from config import ANALYSIS_PROCESSES, SPOTIFY_RATE_LIMIT, SPOTIFY_RATE_BURST
+
+def limit_worker_rate(worker_count):
+    """Give a worker process its share of the Spotify rate limit, so all workers together stay within it"""
+    spotify_client.rate_limiter = TokenBucket(
+        SPOTIFY_RATE_LIMIT / worker_count, max(1, SPOTIFY_RATE_BURST // worker_count)
+    )
+
+def analyze_artist_shard(artist_ids):
+    """Resolve one shard of artists and return its partial GenreAnalysis (runs in a worker process)"""
+    artist_genres = get_artist_genres(artist_ids)
+    genre_counts = Counter()
+    for artist_id in artist_ids:
+        genre_counts.update(artist_genres.get(artist_id, []))
+    return GenreAnalysis.from_genre_counts(genre_counts)
+
+def analyze_track_pages_sharded(track_pages, processes=ANALYSIS_PROCESSES):
+    """Analyze pages of track items across worker processes and merge the partial analyses
+
+    Artists are de-duplicated before sharding, so every artist lands in
+    exactly one shard and the merged counts equal a single-process analysis.
+    Each worker lazily creates its own Spotify client pool, shares the
+    on-disk artist cache and gets an equal share of SPOTIFY_RATE_LIMIT.
+    """
+    _, _, artist_ids = collect_tracks(track_pages)
+    if not artist_ids:
+        return GenreAnalysis()
+    
+    # Shard sizes are whole multiples of the artist batch size, so uncached
+    # lookups go out in full batches (fewer shards than processes if need be)
+    shard_count = max(1, min(processes, len(artist_ids)))
+    shard_size = -(-len(artist_ids) // shard_count)
+    shard_size = -(-shard_size // ARTIST_BATCH_SIZE) * ARTIST_BATCH_SIZE
+    shards = [artist_ids[i:i+shard_size] for i in range(0, len(artist_ids), shard_size)]
+    
+    if len(shards) == 1:
+        return analyze_artist_shard(shards[0])
+    
+    # Spawned (not forked) workers, since the parent holds client pools and thread locks
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=len(shards), mp_context=context, initializer=limit_worker_rate, initargs=(len(shards),)
+    ) as executor:
+        return GenreAnalysis.merge_all(executor.map(analyze_artist_shard, shards))
+
+def analyze_playlist_sharded(playlist_url, processes=ANALYSIS_PROCESSES):
+    """Analyze one playlist or album across worker processes, returning a GenreAnalysis or error dict"""
+    result, source = open_spotify_item(playlist_url)
+    if result is not None:
+        return result if isinstance(result, dict) else result.genre_analysis
+    return analyze_track_pages_sharded(source["track_pages"], processes)
@@ -0,0 +1,173 @@
+import asyncio
+import concurrent.futures
+import hashlib
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from pathlib import Path
+
+from config import COALESCE_LOCK_DIR, COALESCE_WAIT_TIMEOUT
+
+try:
+    import fcntl
+except ImportError:  # Windows: calls are only coalesced within one process
+    fcntl = None
+
+# Seconds between attempts to take a lock held by another process
+LOCK_POLL_INTERVAL = 0.05
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one execution
+
+    Callers in this process wait for the first caller (the leader) and share
+    its result. The leader also holds an exclusive file lock for the key, so
+    a leader in another process waits for it and then calls `lookup`, which
+    returns the published result (or None to run the call itself).
+    """
+
+    def __init__(self, lock_dir=COALESCE_LOCK_DIR, wait_timeout=COALESCE_WAIT_TIMEOUT):
+        self.lock_dir = Path(lock_dir)
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._coalesced = 0
+
+    def _claim(self, key):
+        """Return (future, is_leader) for a key"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self._coalesced += 1
+                return future, False
+            future = concurrent.futures.Future()
+            self._calls[key] = future
+            return future, True
+
+    def _settle(self, key, future, result=None, error=None):
+        with self._lock:
+            del self._calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _lock_file(self, key):
+        """Open the lock file of a key"""
+        self.lock_dir.mkdir(parents=True, exist_ok=True)
+        return open(self.lock_dir / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.lock", "a+b")
+
+    @staticmethod
+    def _try_lock(f):
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    @contextmanager
+    def process_lock(self, key):
+        """Hold the cross-process lock of a key (gives up waiting after wait_timeout)"""
+        if fcntl is None:
+            yield
+            return
+
+        with self._lock_file(key) as f:
+            deadline = time.monotonic() + self.wait_timeout
+            locked = self._try_lock(f)
+            while not locked and time.monotonic() <= deadline:
+                time.sleep(LOCK_POLL_INTERVAL)
+                locked = self._try_lock(f)
+            if not locked:
+                print(f"Gave up waiting for another process on {key}")
+            try:
+                yield
+            finally:
+                if locked:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    @asynccontextmanager
+    async def process_lock_async(self, key):
+        """process_lock for coroutines; waiting polls without blocking the event loop"""
+        if fcntl is None:
+            yield
+            return
+
+        with self._lock_file(key) as f:
+            deadline = time.monotonic() + self.wait_timeout
+            locked = self._try_lock(f)
+            while not locked and time.monotonic() <= deadline:
+                await asyncio.sleep(LOCK_POLL_INTERVAL)
+                locked = self._try_lock(f)
+            if not locked:
+                print(f"Gave up waiting for another process on {key}")
+            try:
+                yield
+            finally:
+                if locked:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _lead(self, key, fn, lookup, started):
+        with self.process_lock(key):
+            if lookup is not None:
+                shared = lookup(started)
+                if shared is not None:
+                    return shared
+            return fn()
+
+    def do(self, key, fn, lookup=None):
+        """Run fn() once for all concurrent callers of key and return its result
+
+        lookup(started) is called under the cross-process lock and should
+        return a result another process published after `started`, or None.
+        """
+        started = time.time()
+        future, leader = self._claim(key)
+        if not leader:
+            return future.result()
+
+        try:
+            result = self._lead(key, fn, lookup, started)
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, result)
+        return result
+
+    async def do_async(self, key, coro_fn, lookup=None):
+        """Await coro_fn() once for all concurrent callers of key, on any event loop"""
+        started = time.time()
+        future, leader = self._claim(key)
+        if not leader:
+            return await asyncio.wrap_future(future)
+
+        loop = asyncio.get_running_loop()
+        try:
+            async with self.process_lock_async(key):
+                result = None
+                if lookup is not None:
+                    result = await loop.run_in_executor(None, lookup, started)
+                if result is None:
+                    result = await coro_fn()
+        except asyncio.CancelledError:
+            self._settle(key, future, error=RuntimeError(f"Coalesced call for {key} was cancelled"))
+            raise
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, result)
+        return result
+
+    def stats(self):
+        """Calls in flight, and how many callers were served by another caller's call"""
+        with self._lock:
+            return {"in_flight": len(self._calls), "coalesced": self._coalesced}
+
+# Shared instance, created on first use
+_single_flight = None
+
+def get_single_flight():
+    """Get the shared SingleFlight"""
+    global _single_flight
+    if _single_flight is None:
+        _single_flight = SingleFlight()
+    return _single_flight
@@ -1,42 +1,88 @@
 import spotipy
 from spotipy.oauth2 import SpotifyClientCredentials, SpotifyOAuth
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import dataclasses
+import threading
+import time
 from models import PlaylistData, GenreAnalysis
-from config import SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, SPOTIFY_REDIRECT_URI
+from artist_cache import get_artist_cache
+from playlist_cache import get_playlist_cache
+from rate_limit import TokenBucket
+from spotify_pool import SpotifyClientPool
+from single_flight import get_single_flight
+from config import (
+    SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, SPOTIFY_REDIRECT_URI,
+    SPOTIFY_MAX_TRACKS, SPOTIFY_PAGE_WORKERS, SPOTIFY_ARTIST_WORKERS,
+    SPOTIFY_RATE_LIMIT, SPOTIFY_RATE_BURST, SPOTIFY_MAX_429_RETRIES,
+    SPOTIFY_POOL_SIZE, SPOTIFY_POOL_CONNECTIONS, SPOTIFY_BATCH_WORKERS, STARTUP_MODE, SPOTIFY_REVALIDATE_INTERVAL
+)
 
-# Global Spotify client
-sp = None
+# Page sizes allowed by the Spotify Web API
+PLAYLIST_PAGE_SIZE = 100
+ALBUM_PAGE_SIZE = 50
+ARTIST_BATCH_SIZE = 50
+
+# Shared limiter keeping all threads under Spotify's rate limit
+rate_limiter = TokenBucket(SPOTIFY_RATE_LIMIT, SPOTIFY_RATE_BURST)
+
+# Shared pool of Spotify clients, replaced only while holding _pool_lock
+spotify_pool = None
+_pool_lock = threading.RLock()
+
+# Outcome of the last credential check: not_started, checking, ready or failed
+spotify_status = {"state": "not_started", "error": None, "checked_at": None}
+_validation_thread = None
 
 def initialize_spotify(use_oauth=False):
-    """Initialize Spotify API client"""
-    global sp
+    """Initialize the Spotify client pool and test it with a live request"""
+    with _pool_lock:
+        return _initialize_spotify(use_oauth)
+
+def create_auth_manager(use_oauth=False):
+    """Create the spotipy auth manager (no network access)"""
+    if use_oauth:
+        return SpotifyOAuth(
+            client_id=SPOTIFY_CLIENT_ID,
+            client_secret=SPOTIFY_CLIENT_SECRET,
+            redirect_uri=SPOTIFY_REDIRECT_URI,
+            scope="user-library-read playlist-read-private playlist-read-collaborative user-read-private",
+            cache_path=".spotify_cache"
+        )
+    return SpotifyClientCredentials(
+        client_id=SPOTIFY_CLIENT_ID,
+        client_secret=SPOTIFY_CLIENT_SECRET
+    )
+
+def create_spotify_pool(use_oauth=False):
+    """Create the client pool without touching the network; tokens are fetched on first use"""
+    return SpotifyClientPool(
+        create_auth_manager(use_oauth),
+        size=SPOTIFY_POOL_SIZE,
+        connections=SPOTIFY_POOL_CONNECTIONS,
+        requests_timeout=60,
+        retries=3
+    )
+
+def _initialize_spotify(use_oauth=False):
+    """Create the Spotify client pool and test it (caller holds _pool_lock)"""
+    global spotify_pool
     try:
         if not SPOTIFY_CLIENT_ID or not SPOTIFY_CLIENT_SECRET:
             print("ERROR: Missing Spotify API credentials. Please set SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET in your .env file.")
             return False
             
-        if use_oauth:
-            auth_manager = SpotifyOAuth(
-                client_id=SPOTIFY_CLIENT_ID,
-                client_secret=SPOTIFY_CLIENT_SECRET,
-                redirect_uri=SPOTIFY_REDIRECT_URI,
-                scope="user-library-read playlist-read-private playlist-read-collaborative user-read-private",
-                cache_path=".spotify_cache"
-            )
-        else:
-            auth_manager = SpotifyClientCredentials(
-                client_id=SPOTIFY_CLIENT_ID,
-                client_secret=SPOTIFY_CLIENT_SECRET
-            )
-            
-        sp = spotipy.Spotify(auth_manager=auth_manager, requests_timeout=60, retries=3)
+        pool = create_spotify_pool(use_oauth)
         
         # Test the connection
         try:
-            if use_oauth:
-                sp.current_user()
-            else:
-                sp.search(q='test', limit=1)
+            with pool.client() as sp:
+                if use_oauth:
+                    sp.current_user()
+                else:
+                    sp.search(q='test', limit=1)
+            spotify_pool = pool
+            _set_spotify_status("ready")
             print("✓ Spotify API connection successful")
             return True
         except spotipy.exceptions.SpotifyException as e:
@@ -44,102 +90,485 @@ def initialize_spotify(use_oauth=False):
             # If client credentials failed, try OAuth as fallback
             if not use_oauth:
                 print("Trying OAuth authentication instead...")
-                return initialize_spotify(use_oauth=True)
+                return _initialize_spotify(use_oauth=True)
+            _set_spotify_status("failed", str(e))
             return False
     except Exception as e:
         print(f"✗ Spotify API initialization failed: {e}")
+        _set_spotify_status("failed", str(e))
         return False
 
-def extract_playlist_data(playlist_url):
-    """Extract data from playlist"""
-    global sp
+def _set_spotify_status(state, error=None):
+    """Record the credential check outcome for readiness reporting"""
+    spotify_status.update({"state": state, "error": error, "checked_at": time.time()})
+
+def get_spotify_status():
+    """Get the current credential check state"""
+    return dict(spotify_status)
+
+def validate_spotify_credentials():
+    """Check the credentials by requesting a token; never falls back to interactive OAuth"""
+    if not SPOTIFY_CLIENT_ID or not SPOTIFY_CLIENT_SECRET:
+        _set_spotify_status("failed", "Missing Spotify API credentials")
+        return False
     
-    # Check Spotify client
-    if not sp:
-        print("Attempting to create new Spotify client...")
-        if not initialize_spotify():
-            return {"error": "Failed to initialize Spotify client"}
+    _set_spotify_status("checking")
+    try:
+        pool = get_spotify_pool()
+        pool.auth_manager.get_access_token(as_dict=False)
+        _set_spotify_status("ready")
+        print("✓ Spotify API credentials validated")
+        return True
+    except Exception as e:
+        print(f"✗ Spotify API credential check failed: {e}")
+        _set_spotify_status("failed", str(e))
+        return False
+
+def start_spotify_validation():
+    """Validate the credentials on a background thread so startup never waits on the network
+
+    Does nothing while a previous validation is still running.
+    """
+    global _validation_thread
+    with _pool_lock:
+        if _validation_thread is None or not _validation_thread.is_alive():
+            _validation_thread = threading.Thread(target=validate_spotify_credentials, name="spotify-validation", daemon=True)
+            _validation_thread.start()
+    return _validation_thread
+
+def revalidate_spotify_if_failed(interval=SPOTIFY_REVALIDATE_INTERVAL):
+    """Start a new credential check if the last one failed at least `interval` seconds ago"""
+    status = get_spotify_status()
+    if status["state"] == "failed" and time.time() - (status["checked_at"] or 0) >= interval:
+        start_spotify_validation()
+
+def get_spotify_pool():
+    """Get the client pool, creating it once if needed
+
+    In lazy startup mode the pool is created without a live probe;
+    in eager mode the first caller runs the full connection test.
+    """
+    global spotify_pool
+    if spotify_pool is None:
+        with _pool_lock:
+            # Another thread may have finished initializing while we waited
+            if spotify_pool is None:
+                if STARTUP_MODE == "eager":
+                    print("Attempting to create new Spotify client...")
+                    _initialize_spotify()
+                elif SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET:
+                    spotify_pool = create_spotify_pool()
+    return spotify_pool
+
+def get_pool_stats():
+    """Report Spotify client pool utilization, or None before initialization"""
+    return spotify_pool.stats() if spotify_pool else None
+
+def call_spotify(method, *args, **kwargs):
+    """Call a spotipy method by name on a pooled client, through the rate limiter"""
+    pool = get_spotify_pool()
+    if pool is None:
+        raise RuntimeError("Spotify client is not initialized")
     
-    # Parse URL and check validity
-    if "playlist/" not in playlist_url and "album/" not in playlist_url:
-        return {"error": "Invalid Spotify URL format"}
+    for attempt in range(SPOTIFY_MAX_429_RETRIES + 1):
+        rate_limiter.acquire()
+        try:
+            with pool.client() as sp:
+                return getattr(sp, method)(*args, **kwargs)
+        except spotipy.exceptions.SpotifyException as e:
+            if e.http_status != 429 or attempt == SPOTIFY_MAX_429_RETRIES:
+                raise
+            
+            # Respect Retry-After for every thread sharing the limiter
+            headers = getattr(e, "headers", None) or {}
+            retry_after = float(headers.get("Retry-After", 1))
+            print(f"Spotify rate limit hit, retrying in {retry_after}s")
+            rate_limiter.pause(retry_after)
+
+def iter_pages(first_page, fetch_page, page_size, max_items=SPOTIFY_MAX_TRACKS):
+    """Yield the items of every page of a paging object, one page at a time
+
+    Once the first page gives the total, the remaining pages are requested
+    concurrently; they are yielded in playlist order as soon as each one
+    (and every page before it) has arrived.
+    """
+    items = first_page.get("items", [])
+    total = min(first_page.get("total") or len(items), max_items)
+    yield items[:total]
     
+    # Offsets of the pages still missing after the first response
+    offsets = list(range(len(items), total, page_size))
+    if not offsets:
+        return
+    
+    with ThreadPoolExecutor(max_workers=min(SPOTIFY_PAGE_WORKERS, len(offsets))) as executor:
+        futures = [executor.submit(fetch_page, offset) for offset in offsets]
+        try:
+            for offset, future in zip(offsets, futures):
+                page = future.result()
+                if page:
+                    yield page.get("items", [])[:total - offset]
+        finally:
+            # Stop outstanding requests if the consumer gives up early
+            for future in futures:
+                future.cancel()
+
+def iter_playlist_pages(item_id, max_items=SPOTIFY_MAX_TRACKS):
+    """Yield pages of playlist track items, up to max_items (nothing is fetched before the first page is read)"""
+    fields = "items(track(id,name,artists(id,name))),total"
+    
+    def fetch_page(offset):
+        return call_spotify(
+            "playlist_tracks",
+            item_id,
+            fields=fields,
+            market="US",
+            limit=PLAYLIST_PAGE_SIZE,
+            offset=offset
+        )
+    
+    yield from iter_pages(fetch_page(0), fetch_page, PLAYLIST_PAGE_SIZE, max_items)
+
+def iter_album_pages(album_info, max_items=SPOTIFY_MAX_TRACKS):
+    """Yield pages of album tracks wrapped like playlist items, reusing the page embedded in the album"""
+    item_id = album_info.get("id")
+    
+    def fetch_page(offset):
+        return call_spotify("album_tracks", item_id, limit=ALBUM_PAGE_SIZE, offset=offset, market="US")
+    
+    first_page = album_info.get("tracks", {})
+    for page_items in iter_pages(first_page, fetch_page, ALBUM_PAGE_SIZE, max_items):
+        yield [{"track": track} for track in page_items]
+
+def lookup_cached_artists(artist_ids):
+    """Get {artist_id: genres} for the artists found in the cache"""
     try:
-        is_playlist = "playlist/" in playlist_url
-        
-        if is_playlist:
-            item_id = playlist_url.split("playlist/")[-1].split("?")[0].split("/")[0]
-            playlist_info = sp.playlist(item_id, fields="name,description")
-            item_name = playlist_info.get("name", "Unknown Playlist")
+        return get_artist_cache().get_many(artist_ids)
+    except Exception as e:
+        print(f"Artist cache lookup failed: {e}")
+        return {}
+
+def fetch_artist_batch(batch):
+    """Fetch genres for up to 50 artists from Spotify and store them in the cache"""
+    fetched = {}
+    artist_info_batch = call_spotify("artists", batch)
+    if artist_info_batch and 'artists' in artist_info_batch:
+        for artist in artist_info_batch['artists']:
+            if artist and artist.get('id'):
+                fetched[artist['id']] = artist.get('genres', [])
+    
+    try:
+        get_artist_cache().set_many(fetched)
+    except Exception as e:
+        print(f"Artist cache update failed: {e}")
+    
+    return fetched
+
+def get_artist_genres(artist_ids):
+    """Get {artist_id: genres}, asking Spotify only for artists missing from the cache"""
+    artist_genres = lookup_cached_artists(artist_ids)
+    
+    missing = [artist_id for artist_id in artist_ids if artist_id not in artist_genres]
+    print(f"Artist genre cache: {len(artist_genres)} hits, {len(missing)} misses")
+    
+    # Process artists in batches (Spotify API allows up to 50 per request)
+    batches = [missing[i:i+ARTIST_BATCH_SIZE] for i in range(0, len(missing), ARTIST_BATCH_SIZE)]
+    if batches:
+        with ThreadPoolExecutor(max_workers=min(SPOTIFY_ARTIST_WORKERS, len(batches))) as executor:
+            for fetched in executor.map(fetch_artist_batch, batches):
+                artist_genres.update(fetched)
+    
+    return artist_genres
+
+def stream_genre_counts(track_pages, max_track_names=10):
+    """Consume pages of track items, resolving artist genres while pages are still arriving
+
+    Artist IDs are de-duplicated on the fly; cache hits are counted at once
+    and misses are sent to Spotify as soon as a full batch of 50 is ready.
+    Returns (track_names, track_count, artist_count, genre_counts) where
+    track_names holds only the first max_track_names names.
+    """
+    track_names = []
+    track_count = 0
+    seen_artists = set()
+    pending = []
+    futures = []
+    genre_counts = Counter()
+    
+    def count_finished(wait=False):
+        # Fold finished batches into the counts, keeping the ones still in flight
+        still_running = []
+        for future in futures:
+            if wait or future.done():
+                for artist_genres in future.result().values():
+                    genre_counts.update(artist_genres)
+            else:
+                still_running.append(future)
+        futures[:] = still_running
+    
+    with ThreadPoolExecutor(max_workers=SPOTIFY_ARTIST_WORKERS) as executor:
+        for page in track_pages:
+            new_artists = []
+            for item in page:
+                track = item.get("track")
+                if not track:
+                    continue
+                track_count += 1
+                if track.get("name") and len(track_names) < max_track_names:
+                    track_names.append(track.get("name"))
+                
+                for artist in track.get("artists") or []:
+                    artist_id = artist.get("id")
+                    if artist_id and artist_id not in seen_artists:
+                        seen_artists.add(artist_id)
+                        new_artists.append(artist_id)
             
-            # Get tracks to analyze genres
-            results = sp.playlist_tracks(
-                item_id,
-                fields="items(track(id,name,artists(id,name)))",
-                market="US",
-                limit=50  
-            )
-            tracks = results.get("items", [])
-        else: 
-            item_id = playlist_url.split("album/")[-1].split("?")[0].split("/")[0]
-            album_info = sp.album(item_id)
-            item_name = album_info.get("name", "Unknown Album")
+            cached = lookup_cached_artists(new_artists)
+            for artist_id in new_artists:
+                if artist_id in cached:
+                    genre_counts.update(cached[artist_id])
+                else:
+                    pending.append(artist_id)
             
-            album_tracks = album_info.get("tracks", {}).get("items", [])[:50]
-            tracks = [{"track": track} for track in album_tracks]
+            # Dispatch every full batch right away
+            while len(pending) >= ARTIST_BATCH_SIZE:
+                futures.append(executor.submit(fetch_artist_batch, pending[:ARTIST_BATCH_SIZE]))
+                pending = pending[ARTIST_BATCH_SIZE:]
             
-        print(f"Found {'playlist' if is_playlist else 'album'}: {item_name}")
+            count_finished()
         
-        if not tracks:
-            return {"error": "No tracks found in the playlist or album"}
+        if pending:
+            futures.append(executor.submit(fetch_artist_batch, pending))
+        count_finished(wait=True)
+    
+    return track_names, track_count, len(seen_artists), genre_counts
+
+def get_cached_playlist_data(item_key, snapshot_id, playlist_url):
+    """Get cached PlaylistData for an unchanged playlist or album, or None"""
+    try:
+        cached = get_playlist_cache().get(item_key, snapshot_id)
+    except Exception as e:
+        print(f"Playlist cache lookup failed: {e}")
+        return None
+    
+    if not cached:
+        return None
+    
+    print(f"Using cached data for {item_key} (snapshot {snapshot_id or 'immutable'})")
+    cached.spotify_url = playlist_url
+    return cached
+
+def cache_playlist_data(item_key, snapshot_id, playlist_data):
+    """Store PlaylistData for reuse until the snapshot changes"""
+    try:
+        get_playlist_cache().set(item_key, playlist_data, snapshot_id)
+    except Exception as e:
+        print(f"Playlist cache update failed: {e}")
+
+def spotify_item_key(playlist_url):
+    """Normalized "playlist:<id>" or "album:<id>" key of a Spotify URL, or None"""
+    for kind in ("playlist", "album"):
+        if f"{kind}/" in playlist_url:
+            item_id = playlist_url.split(f"{kind}/")[-1].split("?")[0].split("/")[0]
+            return f"{kind}:{item_id}"
+    return None
+
+def resolve_spotify_item(playlist_url):
+    """Resolve a playlist/album URL into (result, item) without reading its tracks
+
+    result is cached PlaylistData or an error dict when nothing more needs to
+    be fetched; otherwise it is None and item holds item_key, item_id,
+    snapshot_id and is_playlist (and item_name for playlists). Albums need no
+    Spotify call here, since they have no snapshot to check.
+    """
+    # Parse URL and check validity
+    item_key = spotify_item_key(playlist_url)
+    if item_key is None:
+        return {"error": "Invalid Spotify URL format"}, None
+    
+    is_playlist = item_key.startswith("playlist:")
+    item_id = item_key.split(":", 1)[1]
+    item = {"item_key": item_key, "item_id": item_id, "is_playlist": is_playlist}
+    
+    if is_playlist:
+        # Cheap snapshot check decides whether the cached analysis is still valid
+        playlist_info = call_spotify("playlist", item_id, fields="snapshot_id,name")
+        item["snapshot_id"] = playlist_info.get("snapshot_id", "")
+        item["item_name"] = playlist_info.get("name", "Unknown Playlist")
+        cached = get_cached_playlist_data(item_key, item["snapshot_id"], playlist_url) if item["snapshot_id"] else None
+    else:
+        # Albums are immutable, so a cached entry never goes stale
+        item["snapshot_id"] = ""
+        cached = get_cached_playlist_data(item_key, "", playlist_url)
+    
+    if cached:
+        return cached, None
+    return None, item
+
+def load_spotify_item(item):
+    """Source of a resolved item: the item plus its item_name and a track_pages iterator"""
+    source = dict(item)
+    if source["is_playlist"]:
+        # Stream tracks to analyze genres
+        source["track_pages"] = iter_playlist_pages(source["item_id"])
+    else:
+        album_info = call_spotify("album", source["item_id"])
+        source["item_name"] = album_info.get("name", "Unknown Album")
+        source["track_pages"] = iter_album_pages(album_info)
+    
+    print(f"Found {'playlist' if source['is_playlist'] else 'album'}: {source['item_name']}")
+    return source
+
+def open_spotify_item(playlist_url):
+    """Resolve a playlist/album URL into (result, source)
+
+    result is cached PlaylistData or an error dict when nothing more needs to
+    be fetched; otherwise it is None and source describes the item to analyze
+    (item_key, snapshot_id, item_name, is_playlist and a track_pages iterator).
+    """
+    result, item = resolve_spotify_item(playlist_url)
+    if result is not None:
+        return result, None
+    return None, load_spotify_item(item)
+
+def finish_playlist_data(source, playlist_url, track_names, track_count, artist_count, genre_counts):
+    """Build PlaylistData from analyzed tracks and cache it, or return an error dict"""
+    if not track_count:
+        return {"error": "No tracks found in the playlist or album"}
+    
+    if not artist_count:
+        return {"error": "No artists found in tracks"}
         
-        # Extract all artist IDs from tracks
-        artists = []
-        track_names = []
+    print(f"Found {artist_count} unique artists in {track_count} tracks")
+    
+    # Create genre analysis
+    genre_analysis = GenreAnalysis.from_genre_counts(genre_counts)
+    
+    # Create playlist data
+    playlist_data = PlaylistData(
+        item_name=source["item_name"],
+        track_names=track_names,
+        genre_analysis=genre_analysis,
+        spotify_url=playlist_url,
+        found_genres=bool(genre_counts)
+    )
+    
+    if source["is_playlist"] and not source["snapshot_id"]:
+        # Without a snapshot there is no way to tell when the entry goes stale
+        return playlist_data
+    
+    cache_playlist_data(source["item_key"], source["snapshot_id"], playlist_data)
+    return playlist_data
+
+def analyze_spotify_item(source, playlist_url):
+    """Read and analyze the tracks of an item opened by open_spotify_item"""
+    # Resolve genres while the remaining pages are still downloading
+    track_names, track_count, artist_count, genre_counts = stream_genre_counts(source["track_pages"])
+    
+    return finish_playlist_data(source, playlist_url, track_names, track_count, artist_count, genre_counts)
+
+def extract_playlist_data(playlist_url):
+    """Extract data from playlist"""
+    # Check Spotify client
+    if not get_spotify_pool():
+        return {"error": "Failed to initialize Spotify client"}
+    
+    try:
+        result, item = resolve_spotify_item(playlist_url)
+        if result is not None:
+            return result
         
-        for item in tracks:
+        # Concurrent requests for the same playlist version (or album, including
+        # its metadata lookup) share one analysis; a process that waited on
+        # another finds its result in the playlist cache
+        item_key, snapshot_id = item["item_key"], item["snapshot_id"]
+        result = get_single_flight().do(
+            f"extract:{item_key}@{snapshot_id}" if item["is_playlist"] else f"extract:{item_key}",
+            lambda: analyze_spotify_item(load_spotify_item(item), playlist_url),
+            lookup=lambda started: get_cached_playlist_data(item_key, snapshot_id, playlist_url)
+        )
+        if isinstance(result, PlaylistData) and result.spotify_url != playlist_url:
+            result = dataclasses.replace(result, spotify_url=playlist_url)
+        return result
+        
+    except Exception as e:
+        print(f"Error extracting data: {e}")
+        return {"error": f"Error extracting data: {str(e)}"}
+
+def collect_tracks(track_pages, max_track_names=10):
+    """Read track pages into (track_names, track_count, unique artist IDs in first-appearance order)"""
+    track_names = []
+    track_count = 0
+    artist_ids = {}
+    
+    for page in track_pages:
+        for item in page:
             track = item.get("track")
-            if track and track.get("name"):
+            if not track:
+                continue
+            track_count += 1
+            if track.get("name") and len(track_names) < max_track_names:
                 track_names.append(track.get("name"))
-                
-            if track and track.get("artists"):
-                for artist in track.get("artists"):
-                    if artist.get("id"):
-                        artists.append(artist.get("id"))
-        
-        if not artists:
-            return {"error": "No artists found in tracks"}
             
-        print(f"Found {len(set(artists))} unique artists in {len(tracks)} tracks")
-        
-        # Get genres from artists
-        genres = []
-        unique_artist_ids = list(set(artists))[:50]  # Limit to 50 artists max for API calls
-        
-        # Process artists in batches (Spotify API allows up to 50 per request)
-        for i in range(0, len(unique_artist_ids), 50):
-            batch = unique_artist_ids[i:min(i+50, len(unique_artist_ids))]
+            for artist in track.get("artists") or []:
+                if artist.get("id"):
+                    artist_ids.setdefault(artist.get("id"))
+    
+    return track_names, track_count, list(artist_ids)
+
+def extract_playlists_data(playlist_urls):
+    """Extract data from many playlists/albums, resolving each shared artist only once
+
+    Tracks of all items are read concurrently, then the union of their
+    artists goes through one set of cached, batched lookups. Returns a list
+    aligned with playlist_urls holding PlaylistData or an error dict.
+    """
+    if not get_spotify_pool():
+        return [{"error": "Failed to initialize Spotify client"} for _ in playlist_urls]
+    
+    results = [None] * len(playlist_urls)
+    collected = {}
+    
+    def open_and_collect(playlist_url):
+        result, source = open_spotify_item(playlist_url)
+        if result is not None:
+            return result, None
+        return None, (source, *collect_tracks(source["track_pages"]))
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(SPOTIFY_BATCH_WORKERS, len(playlist_urls)))) as executor:
+        futures = [executor.submit(open_and_collect, url) for url in playlist_urls]
+        for i, future in enumerate(futures):
+            try:
+                result, tracks = future.result()
+            except Exception as e:
+                print(f"Error extracting data for {playlist_urls[i]}: {e}")
+                result, tracks = {"error": f"Error extracting data: {str(e)}"}, None
             
-            artist_info_batch = sp.artists(batch)
-            if artist_info_batch and 'artists' in artist_info_batch:
-                for artist in artist_info_batch['artists']:
-                    artist_genres = artist.get('genres', [])
-                    genres.extend(artist_genres)
-        
-        # Create genre analysis
-        genre_analysis = GenreAnalysis.from_genre_list(genres)
-        
-        # Create playlist data
-        playlist_data = PlaylistData(
-            item_name=item_name,
-            track_names=track_names[:10],
-            genre_analysis=genre_analysis,
-            spotify_url=playlist_url,
-            found_genres=bool(genres)
-        )
-        
-        return playlist_data
-        
+            if result is not None:
+                results[i] = result
+            else:
+                collected[i] = tracks
+    
+    # One set of batched lookups for the union of all artists
+    all_artist_ids = list(dict.fromkeys(
+        artist_id for _, _, _, artist_ids in collected.values() for artist_id in artist_ids
+    ))
+    print(f"Batch of {len(playlist_urls)} items shares {len(all_artist_ids)} unique artists")
+    
+    try:
+        artist_genres = get_artist_genres(all_artist_ids) if all_artist_ids else {}
     except Exception as e:
-        print(f"Error extracting data: {e}")
-        return {"error": f"Error extracting data: {str(e)}"}
\ No newline at end of file
+        print(f"Error resolving artists: {e}")
+        for i in collected:
+            results[i] = {"error": f"Error extracting data: {str(e)}"}
+        return results
+    
+    for i, (source, track_names, track_count, artist_ids) in collected.items():
+        genre_counts = Counter()
+        for artist_id in artist_ids:
+            genre_counts.update(artist_genres.get(artist_id, []))
+        results[i] = finish_playlist_data(
+            source, playlist_urls[i], track_names, track_count, len(artist_ids), genre_counts
+        )
+    
+    return results
@@ -0,0 +1,112 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+import spotipy
+import urllib3
+from requests.adapters import HTTPAdapter
+
+# Statuses urllib3 retries on its own; 429 is handled by call_spotify
+SERVER_ERROR_CODES = (500, 502, 503, 504)
+
+class LockedAuthManager:
+    """Wrap a spotipy auth manager so only one thread refreshes the token at a time"""
+
+    def __init__(self, auth_manager):
+        self.auth_manager = auth_manager
+        self._lock = threading.Lock()
+
+    def get_access_token(self, *args, **kwargs):
+        """Get a valid token; concurrent callers wait for a single refresh"""
+        with self._lock:
+            return self.auth_manager.get_access_token(*args, **kwargs)
+
+    def __getattr__(self, name):
+        # Everything else (cache handlers, scopes, ...) is read straight from the wrapped manager
+        return getattr(self.auth_manager, name)
+
+class SpotifyClientPool:
+    """Fixed-size pool of spotipy clients sharing one auth manager
+
+    Each client owns a requests.Session with keep-alive connections, so
+    a checked-out client is never used by two threads at once and TLS
+    connections are reused between calls.
+    """
+
+    def __init__(self, auth_manager, size=8, connections=4, requests_timeout=60, retries=3):
+        self.auth_manager = LockedAuthManager(auth_manager)
+        self.size = size
+        self._clients = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._peak_in_use = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+
+        for _ in range(size):
+            # spotipy only installs its retry policy on sessions it builds itself,
+            # so a similar policy is mounted here on a larger connection pool.
+            # 429 is left out (urllib3 would also retry it whenever Retry-After is
+            # set): call_spotify retries it through the shared token bucket and
+            # needs the Retry-After header
+            retry = urllib3.Retry(
+                total=retries,
+                connect=None,
+                read=False,
+                allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+                status=retries,
+                backoff_factor=0.3,
+                status_forcelist=SERVER_ERROR_CODES,
+                respect_retry_after_header=False
+            )
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=connections, pool_maxsize=connections, max_retries=retry)
+            session.mount("https://", adapter)
+            self._clients.put(spotipy.Spotify(
+                auth_manager=self.auth_manager,
+                requests_session=session,
+                requests_timeout=requests_timeout,
+                retries=retries
+            ))
+
+    @contextmanager
+    def client(self, timeout=None):
+        """Check out a client for the duration of a with-block"""
+        started = time.monotonic()
+        try:
+            sp = self._clients.get_nowait()
+            waited = False
+        except queue.Empty:
+            sp = self._clients.get(timeout=timeout)
+            waited = True
+
+        with self._lock:
+            self._checkouts += 1
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+            if waited:
+                self._waits += 1
+                self._wait_time += time.monotonic() - started
+
+        try:
+            yield sp
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._clients.put(sp)
+
+    def stats(self):
+        """Report pool utilization"""
+        with self._lock:
+            return {
+                "size": self.size,
+                "in_use": self._in_use,
+                "available": self.size - self._in_use,
+                "peak_in_use": self._peak_in_use,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "total_wait_seconds": round(self._wait_time, 3)
+            }
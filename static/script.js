@@ -410,7 +410,8 @@ document.addEventListener('DOMContentLoaded', function() {
     if (copyCoverButton) {
         copyCoverButton.addEventListener('click', function() {
             const imagePath = this.getAttribute('data-image-path');
-            const imageUrl = `/generated_covers/${imagePath}`;
+            // Always download the original PNG, whatever the browser accepts
+            const imageUrl = `/generated_covers/${imagePath}?format=png`;
             
             // Create a temporary link to download the image
             const a = document.createElement('a');
@@ -467,8 +468,8 @@ document.addEventListener('DOMContentLoaded', function() {
             .then(response => response.json())
             .then(data => {
                 if (data.success) {
-                    // Refresh the page to show new results
-                    window.location.reload();
+                    // The cover is generated in the background; its job page shows the result when done
+                    window.location.href = data.status_url.replace('/api/jobs/', '/jobs/');
                 } else {
                     // Remove loading overlay
                     document.body.removeChild(loadingOverlay);
@@ -0,0 +1,23 @@
+import pytest
+
+import image_generator
+from image_backends import FakeImageBackend
+
+@pytest.fixture
+def fake_backend(monkeypatch):
+    monkeypatch.setattr(image_generator, "IMAGE_CACHE_ENABLED", False)
+    monkeypatch.setattr(image_generator, "get_image_backend", lambda: FakeImageBackend(latency=0, error_rate=0, size=64))
+
+def test_generate_cover_variants_returns_one_image_per_seed(fake_backend):
+    results = image_generator.generate_cover_variants("test prompt", seeds=[1, 2, 3])
+
+    assert [seed for seed, _ in results] == [1, 2, 3]
+    assert all(image.size == (64, 64) for _, image in results)
+
+def test_generate_cover_variants_writes_output_paths(fake_backend, tmp_path):
+    paths = [tmp_path / "a.png", tmp_path / "b.png"]
+
+    results = image_generator.generate_cover_variants("test prompt", output_paths=paths, seeds=[5, 6])
+
+    assert [result for _, result in results] == [True, True]
+    assert all(path.exists() for path in paths)
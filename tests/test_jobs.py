@@ -0,0 +1,125 @@
+import threading
+import time
+
+import pytest
+
+from jobs import JobStore, JobQueue, QueueFullError, QUEUED, RUNNING, DONE, FAILED
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(tmp_path / "jobs.sqlite3")
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+def test_claim_succeeds_once(store):
+    job_id = store.create("generate", {})
+    assert store.claim(job_id, "worker-a")
+    assert not store.claim(job_id, "worker-b")
+    job = store.get(job_id)
+    assert job["status"] == RUNNING
+    assert job["owner"] == "worker-a"
+
+def test_concurrent_claims_have_one_winner(store):
+    job_id = store.create("generate", {})
+    wins = []
+    threads = [threading.Thread(target=lambda i=i: wins.append(store.claim(job_id, f"w{i}"))) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert wins.count(True) == 1
+
+def test_two_queues_on_one_store_run_each_job_once(store):
+    runs = []
+    lock = threading.Lock()
+
+    def handler(n):
+        with lock:
+            runs.append(n)
+        time.sleep(0.05)
+        return {"n": n}
+
+    job_ids = [store.create("work", {"n": n}) for n in range(10)]
+    queues = [JobQueue(store, {"work": handler}, workers=3, heartbeat_interval=0.05) for _ in range(2)]
+    for queue in queues:
+        queue.start()
+
+    assert wait_for(lambda: all(store.get(job_id)["status"] == DONE for job_id in job_ids))
+    assert sorted(runs) == list(range(10))
+
+def test_empty_error_message_is_still_a_failure(store):
+    def handler():
+        raise KeyError()
+
+    queue = JobQueue(store, {"bad": handler}, workers=1)
+    queue.start()
+    job_id = queue.submit("bad", {})
+    assert wait_for(lambda: store.get(job_id)["status"] != QUEUED and store.get(job_id)["finished_at"])
+    job = store.get(job_id)
+    assert job["status"] == FAILED
+    assert job["error"] == "KeyError"
+    assert job["result"] is None
+
+def test_error_dict_result_marks_the_job_failed(store):
+    queue = JobQueue(store, {"gen": lambda: {"error": "Invalid Spotify URL format"}}, workers=1)
+    queue.start()
+    job_id = queue.submit("gen", {})
+    assert wait_for(lambda: store.get(job_id)["status"] == FAILED)
+    assert store.get(job_id)["error"] == "Invalid Spotify URL format"
+
+def test_stale_running_job_is_recovered_on_restart(store):
+    job_id = store.create("work", {"n": 1})
+    assert store.claim(job_id, "dead-worker")
+    # The dead worker's last heartbeat is long gone
+    store._execute("UPDATE jobs SET heartbeat_at = ? WHERE job_id = ?", (time.time() - 3600, job_id))
+
+    queue = JobQueue(store, {"work": lambda n: {"n": n}}, workers=1, stale_after=60)
+    queue.start()
+    assert wait_for(lambda: store.get(job_id)["status"] == DONE)
+    assert store.get(job_id)["result"] == {"n": 1}
+
+def test_job_with_a_live_owner_is_not_taken_over(store):
+    runs = []
+    job_id = store.create("work", {})
+    assert store.claim(job_id, "live-worker")
+
+    queue = JobQueue(store, {"work": lambda: runs.append(1)}, workers=1, heartbeat_interval=0.05, stale_after=60)
+    queue.start()
+    time.sleep(0.3)
+    assert runs == []
+    assert store.get(job_id)["owner"] == "live-worker"
+
+def test_requeue_stale_only_touches_silent_jobs(store):
+    silent = store.create("work", {})
+    alive = store.create("work", {})
+    store.claim(silent, "a")
+    store.claim(alive, "b")
+    store._execute("UPDATE jobs SET heartbeat_at = ? WHERE job_id = ?", (time.time() - 120, silent))
+    assert store.requeue_stale(60) == [silent]
+    assert store.get(silent)["status"] == QUEUED
+    assert store.get(alive)["status"] == RUNNING
+
+def test_queued_jobs_are_picked_up_on_start(store):
+    job_id = store.create("work", {})
+    queue = JobQueue(store, {"work": lambda: {"ok": True}}, workers=1)
+    queue.start()
+    assert wait_for(lambda: store.get(job_id)["status"] == DONE)
+
+def test_full_queue_rejects_submissions(store):
+    queue = JobQueue(store, {"work": lambda: None}, workers=1, limit=2)
+    # Not started, so nothing drains the queue
+    queue.submit("work", {})
+    queue.submit("work", {})
+    with pytest.raises(QueueFullError):
+        queue.submit("work", {})
+
+def test_unknown_job_kind_is_rejected(store):
+    queue = JobQueue(store, {}, workers=1)
+    with pytest.raises(ValueError):
+        queue.submit("missing", {})
@@ -0,0 +1,32 @@
+import random
+
+from models import (
+    MOOD_KEYWORDS, LOW_ENERGY_KEYWORDS, HIGH_ENERGY_KEYWORDS, classify_genre, keyword_matcher
+)
+
+ALL_KEYWORDS = {kw for kws in MOOD_KEYWORDS.values() for kw in kws} | set(LOW_ENERGY_KEYWORDS) | set(HIGH_ENERGY_KEYWORDS)
+
+def substring_scan(keywords, text):
+    return {kw for kw in keywords if kw in text}
+
+def test_matcher_equals_substring_scan_with_prefix_keywords():
+    keywords = ["pop", "popular", "ular", "art", "a", "lo-fi", "lo"]
+    find = keyword_matcher(keywords)
+    for text in ["popular party", "lo-fi pop", "k-pop", "", "aaa", "popularity art-pop"]:
+        assert find(text) == substring_scan(keywords, text)
+
+def test_matcher_equals_substring_scan_on_random_genres():
+    find = keyword_matcher(ALL_KEYWORDS)
+    rng = random.Random(7)
+    pieces = sorted(ALL_KEYWORDS) + ["indie", "k", "-", " ", "x", "core", "wave"]
+    for _ in range(2000):
+        text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 5)))
+        assert find(text) == substring_scan(ALL_KEYWORDS, text)
+
+def test_classify_genre_matches_old_substring_checks():
+    for genre in ["Chill House", "lo-fi hip hop", "acoustic folk", "death metal", "j-pop", "vaporwave"]:
+        lower = genre.lower()
+        moods, is_low, is_high = classify_genre(genre)
+        assert set(moods) == {mood for mood, kws in MOOD_KEYWORDS.items() if any(kw in lower for kw in kws)}
+        assert is_low == any(kw in lower for kw in LOW_ENERGY_KEYWORDS)
+        assert is_high == any(kw in lower for kw in HIGH_ENERGY_KEYWORDS)
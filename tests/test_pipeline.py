@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+import pytest
+
+from pipeline import Stage, PipelineAbort, run_stages
+
+def run(stages):
+    return asyncio.run(run_stages(stages))
+
+def test_stages_receive_results_of_their_dependencies():
+    async def double(results):
+        return results["source"] * 2
+
+    result = run([
+        Stage("source", lambda results: 21),
+        Stage("double", double, ("source",))
+    ])
+    assert result.results == {"source": 21, "double": 42}
+    assert set(result.timings) == {"source", "double"}
+
+def test_independent_stages_run_concurrently():
+    async def wait(results):
+        await asyncio.sleep(0.3)
+
+    started = time.monotonic()
+    run([Stage(name, wait) for name in ("a", "b", "c")])
+    assert time.monotonic() - started < 0.6
+
+def test_required_failure_aborts_and_cancels_running_stages():
+    cancelled = []
+
+    async def slow(results):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    def broken(results):
+        raise ValueError("no data")
+
+    with pytest.raises(PipelineAbort, match="broken failed: no data"):
+        run([Stage("slow", slow), Stage("broken", broken)])
+    assert cancelled == [True]
+
+def test_pipeline_abort_message_is_kept():
+    def extract(results):
+        raise PipelineAbort("Invalid Spotify URL format")
+
+    with pytest.raises(PipelineAbort, match="^Invalid Spotify URL format$"):
+        run([Stage("extract", extract)])
+
+def test_optional_failure_uses_default():
+    def title(results):
+        raise RuntimeError("Gemini down")
+
+    result = run([
+        Stage("title", title, required=False, default="New Album"),
+        Stage("plan", lambda results: results["title"].upper(), ("title",))
+    ])
+    assert result.results["plan"] == "NEW ALBUM"
+
+def test_required_timeout_aborts():
+    async def slow(results):
+        await asyncio.sleep(5)
+
+    started = time.monotonic()
+    with pytest.raises(PipelineAbort, match="image timed out after 0.2s"):
+        run([Stage("image", slow, timeout=0.2)])
+    assert time.monotonic() - started < 2
+
+def test_optional_timeout_uses_default():
+    async def slow(results):
+        await asyncio.sleep(5)
+
+    result = run([Stage("chart", slow, timeout=0.1, required=False, default="")])
+    assert result.results["chart"] == ""
+
+def test_dependents_of_an_aborting_stage_never_run():
+    ran = []
+
+    def fail(results):
+        raise PipelineAbort("stop")
+
+    with pytest.raises(PipelineAbort):
+        run([Stage("first", fail), Stage("second", lambda results: ran.append(1), ("first",))])
+    assert ran == []
+
+def test_unknown_dependency_is_rejected():
+    with pytest.raises(ValueError, match="unknown stage 'missing'"):
+        run([Stage("a", lambda results: 1, ("missing",))])
+
+def test_dependency_cycle_is_rejected():
+    with pytest.raises(ValueError, match="cycle"):
+        run([Stage("a", lambda results: 1, ("b",)), Stage("b", lambda results: 2, ("a",))])
+
+def test_timed_out_thread_stage_does_not_hold_up_asyncio_run():
+    def stuck(results):
+        time.sleep(1.5)
+
+    started = time.monotonic()
+    result = run([Stage("stuck", stuck, timeout=0.2, required=False, default="skipped")])
+    assert result.results == {"stuck": "skipped"}
+    assert time.monotonic() - started < 1
@@ -0,0 +1,89 @@
+import threading
+import time
+
+import pytest
+import spotipy
+
+import spotify_client
+from rate_limit import TokenBucket
+
+def test_burst_is_served_immediately():
+    bucket = TokenBucket(rate=10, capacity=5)
+    started = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - started < 0.05
+
+def test_rate_is_enforced_after_the_burst():
+    bucket = TokenBucket(rate=20, capacity=1)
+    started = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    # One token at once, then four more at 20 per second
+    assert 0.18 <= time.monotonic() - started < 0.5
+
+def test_rate_is_shared_between_threads():
+    bucket = TokenBucket(rate=50, capacity=1)
+    started = time.monotonic()
+    threads = [threading.Thread(target=lambda: [bucket.acquire() for _ in range(5)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 20 tokens at 50 per second, whatever the number of threads
+    assert time.monotonic() - started >= 0.35
+
+def test_pause_blocks_every_caller():
+    bucket = TokenBucket(rate=1000, capacity=10)
+    bucket.pause(0.2)
+    started = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - started >= 0.18
+
+class FakeClient:
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def artists(self, ids):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise spotipy.exceptions.SpotifyException(429, -1, "rate limited", headers={"Retry-After": "0.1"})
+        return {"artists": ids}
+
+class FakePool:
+    def __init__(self, client):
+        self.sp = client
+
+    def client(self):
+        pool = self
+
+        class Checkout:
+            def __enter__(self):
+                return pool.sp
+
+            def __exit__(self, *exc):
+                return False
+        return Checkout()
+
+@pytest.fixture
+def fake_spotify(monkeypatch):
+    def install(failures):
+        client = FakeClient(failures)
+        monkeypatch.setattr(spotify_client, "get_spotify_pool", lambda: FakePool(client))
+        monkeypatch.setattr(spotify_client, "rate_limiter", TokenBucket(rate=1000))
+        return client
+    return install
+
+def test_call_spotify_waits_for_retry_after_on_429(fake_spotify):
+    client = fake_spotify(failures=2)
+    started = time.monotonic()
+    assert spotify_client.call_spotify("artists", ["a"]) == {"artists": ["a"]}
+    assert client.calls == 3
+    assert time.monotonic() - started >= 0.18
+
+def test_call_spotify_gives_up_after_max_retries(fake_spotify):
+    client = fake_spotify(failures=100)
+    with pytest.raises(spotipy.exceptions.SpotifyException):
+        spotify_client.call_spotify("artists", ["a"])
+    assert client.calls == spotify_client.SPOTIFY_MAX_429_RETRIES + 1
@@ -0,0 +1,165 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from resilience import CLOSED, OPEN, HALF_OPEN, CircuitBreaker, LatencyTracker, hedged_call, hedged_call_async
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=60)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+def test_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0.1)
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.15)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+
+def test_successful_trial_closes_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0.05)
+    breaker.record_failure()
+    time.sleep(0.1)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow() and breaker.allow()
+
+def test_failed_trial_reopens_for_a_full_cooldown():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0.1)
+    breaker.record_failure()
+    time.sleep(0.15)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+def test_latency_percentile_needs_enough_samples():
+    tracker = LatencyTracker(window=100, min_samples=10)
+    for i in range(9):
+        tracker.record(i)
+    assert tracker.percentile(95) is None
+    for i in range(9, 100):
+        tracker.record(i)
+    assert tracker.percentile(95) == 95
+    assert tracker.percentile(50) == 50
+
+@pytest.fixture
+def executor():
+    pool = ThreadPoolExecutor(max_workers=4)
+    yield pool
+    # Calls that lost to a hedge or the budget are left to finish on their own
+    pool.shutdown(wait=False)
+
+def test_hedged_call_returns_fast_result_without_hedging(executor):
+    calls = []
+    assert hedged_call(executor, lambda timeout: calls.append(timeout) or "ok", 1, 0.5) == "ok"
+    assert len(calls) == 1
+
+def test_hedge_wins_over_a_slow_first_call(executor):
+    attempts = []
+    lock = threading.Lock()
+
+    def call(timeout):
+        with lock:
+            attempts.append(timeout)
+            attempt = len(attempts)
+        time.sleep(2 if attempt == 1 else 0.05)
+        return attempt
+
+    started = time.monotonic()
+    assert hedged_call(executor, call, 3, 0.1) == 2
+    assert time.monotonic() - started < 1
+    # The hedge only gets what is left of the budget
+    assert attempts[1] < attempts[0]
+
+def test_failed_first_call_starts_the_hedge_at_once(executor):
+    attempts = []
+
+    def call(timeout):
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise ConnectionError("reset")
+        return "second"
+
+    assert hedged_call(executor, call, 2, 1.0) == "second"
+    assert attempts[1] - attempts[0] < 0.5
+
+def test_hedged_call_raises_the_last_error(executor):
+    def call(timeout):
+        raise ConnectionError("down")
+
+    with pytest.raises(ConnectionError):
+        hedged_call(executor, call, 1, 0.1)
+
+def test_hedged_call_is_bounded_by_the_budget(executor):
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        hedged_call(executor, lambda timeout: time.sleep(2), 0.3, 0.1)
+    assert time.monotonic() - started < 1
+
+def test_hedged_call_without_hedging_makes_one_call(executor):
+    calls = []
+
+    def call(timeout):
+        calls.append(1)
+        time.sleep(0.5)
+
+    with pytest.raises(TimeoutError):
+        hedged_call(executor, call, 0.2, None)
+    assert len(calls) == 1
+
+def test_async_hedge_wins_and_the_slow_call_is_cancelled():
+    cancelled = []
+    attempts = []
+
+    async def call(timeout):
+        attempts.append(timeout)
+        attempt = len(attempts)
+        try:
+            await asyncio.sleep(2 if attempt == 1 else 0.05)
+        except asyncio.CancelledError:
+            cancelled.append(attempt)
+            raise
+        return attempt
+
+    async def main():
+        result = await hedged_call_async(call, 3, 0.1)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(main()) == 2
+    assert cancelled == [1]
+
+def test_async_hedged_call_is_bounded_by_the_budget():
+    async def call(timeout):
+        await asyncio.sleep(2)
+
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        asyncio.run(hedged_call_async(call, 0.3, 0.1))
+    assert time.monotonic() - started < 1
+
+def test_async_hedged_call_raises_the_last_error():
+    async def call(timeout):
+        raise ConnectionError("down")
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(hedged_call_async(call, 1, 0.1))
@@ -0,0 +1,171 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from single_flight import SingleFlight
+
+@pytest.fixture
+def flight(tmp_path):
+    return SingleFlight(lock_dir=tmp_path / "locks", wait_timeout=5)
+
+def run_concurrently(count, target):
+    results = [None] * count
+    errors = [None] * count
+
+    def call(i):
+        try:
+            results[i] = target()
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+def test_followers_share_the_leaders_result(flight):
+    calls = []
+
+    def work():
+        calls.append(1)
+        time.sleep(0.3)
+        return "result"
+
+    results, errors = run_concurrently(6, lambda: flight.do("key", work))
+    assert results == ["result"] * 6
+    assert errors == [None] * 6
+    assert len(calls) == 1
+    assert flight.stats() == {"in_flight": 0, "coalesced": 5}
+
+def test_leader_error_reaches_every_follower(flight):
+    def work():
+        time.sleep(0.3)
+        raise ValueError("upstream failed")
+
+    results, errors = run_concurrently(4, lambda: flight.do("key", work))
+    assert all(isinstance(e, ValueError) and str(e) == "upstream failed" for e in errors)
+    # The failed call is forgotten, so the next caller runs it again
+    assert flight.do("key", lambda: "retried") == "retried"
+
+def test_different_keys_run_separately(flight):
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+
+def test_lookup_result_skips_the_call(flight):
+    seen = []
+    result = flight.do("key", lambda: "called", lookup=lambda started: seen.append(started) or "published")
+    assert result == "published"
+    assert seen and seen[0] <= time.time()
+
+def test_lookup_miss_runs_the_call(flight):
+    assert flight.do("key", lambda: "called", lookup=lambda started: None) == "called"
+
+def test_process_lock_waits_for_another_holder(flight, tmp_path):
+    other = SingleFlight(lock_dir=tmp_path / "locks", wait_timeout=5)
+    order = []
+
+    def hold():
+        with other.process_lock("key"):
+            order.append("held")
+            time.sleep(0.3)
+        order.append("released")
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    time.sleep(0.1)
+    with flight.process_lock("key"):
+        order.append("acquired")
+    thread.join()
+    assert order == ["held", "released", "acquired"]
+
+def test_process_lock_gives_up_after_wait_timeout(tmp_path):
+    holder = SingleFlight(lock_dir=tmp_path / "locks", wait_timeout=5)
+    impatient = SingleFlight(lock_dir=tmp_path / "locks", wait_timeout=0.2)
+    with holder.process_lock("key"):
+        started = time.monotonic()
+        with impatient.process_lock("key"):
+            waited = time.monotonic() - started
+    assert 0.2 <= waited < 2
+
+def test_async_followers_share_one_call(flight):
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.2)
+        return "title"
+
+    async def main():
+        return await asyncio.gather(*[flight.do_async("key", work) for _ in range(5)])
+
+    assert asyncio.run(main()) == ["title"] * 5
+    assert len(calls) == 1
+
+def test_async_leader_error_propagates(flight):
+    async def work():
+        await asyncio.sleep(0.1)
+        raise KeyError("missing")
+
+    async def main():
+        return await asyncio.gather(*[flight.do_async("key", work) for _ in range(3)], return_exceptions=True)
+
+    assert all(isinstance(result, KeyError) for result in asyncio.run(main()))
+    assert flight.stats()["in_flight"] == 0
+
+def test_cancelled_async_leader_fails_followers(flight):
+    async def work():
+        await asyncio.sleep(10)
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do_async("key", work))
+        await asyncio.sleep(0.1)
+        follower = asyncio.ensure_future(flight.do_async("key", work))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        return await asyncio.gather(leader, follower, return_exceptions=True)
+
+    leader_result, follower_result = asyncio.run(main())
+    assert isinstance(leader_result, asyncio.CancelledError)
+    assert isinstance(follower_result, RuntimeError)
+    assert flight.stats()["in_flight"] == 0
+
+def test_async_leader_waiting_for_the_lock_can_be_cancelled(flight, tmp_path):
+    holder = SingleFlight(lock_dir=tmp_path / "locks", wait_timeout=5)
+
+    async def work():
+        return "never"
+
+    with holder.process_lock("key"):
+        started = time.monotonic()
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(asyncio.wait_for(flight.do_async("key", work), 0.2))
+        assert time.monotonic() - started < 1
+
+    # Nothing is left holding the lock
+    assert flight.do("key", lambda: "free") == "free"
+
+def test_concurrent_album_extractions_fetch_the_album_once(flight, monkeypatch):
+    import spotify_client
+
+    calls = []
+
+    def call_spotify(method, *args, **kwargs):
+        calls.append(method)
+        time.sleep(0.2)
+        return {"name": "Album", "tracks": {"items": [], "next": None}}
+
+    monkeypatch.setattr(spotify_client, "get_spotify_pool", lambda: object())
+    monkeypatch.setattr(spotify_client, "get_single_flight", lambda: flight)
+    monkeypatch.setattr(spotify_client, "get_cached_playlist_data", lambda *args: None)
+    monkeypatch.setattr(spotify_client, "cache_playlist_data", lambda *args: None)
+    monkeypatch.setattr(spotify_client, "call_spotify", call_spotify)
+    monkeypatch.setattr(spotify_client, "stream_genre_counts", lambda pages: (["Track"], 1, 1, {"rock": 1}))
+
+    results, errors = run_concurrently(5, lambda: spotify_client.extract_playlist_data("https://open.spotify.com/album/abc?si=1"))
+    assert errors == [None] * 5
+    assert [result.item_name for result in results] == ["Album"] * 5
+    assert calls == ["album"]
@@ -0,0 +1,87 @@
+import queue
+import threading
+import time
+
+import pytest
+
+from spotify_pool import LockedAuthManager, SpotifyClientPool
+
+class SlowAuthManager:
+    """Counts token requests and how many run at the same time"""
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self.calls = 0
+        self.scope = "none"
+        self._lock = threading.Lock()
+
+    def get_access_token(self, as_dict=True):
+        with self._lock:
+            self.active += 1
+            self.calls += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.05)
+        with self._lock:
+            self.active -= 1
+        return "token"
+
+def test_token_refreshes_never_overlap():
+    auth = SlowAuthManager()
+    locked = LockedAuthManager(auth)
+    threads = [threading.Thread(target=locked.get_access_token) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert auth.calls == 5
+    assert auth.max_active == 1
+
+def test_other_attributes_come_from_the_wrapped_manager():
+    assert LockedAuthManager(SlowAuthManager()).scope == "none"
+
+def test_checked_out_clients_are_never_shared():
+    pool = SpotifyClientPool(SlowAuthManager(), size=2)
+    with pool.client() as first, pool.client() as second:
+        assert first is not second
+        assert pool.stats()["in_use"] == 2
+        with pytest.raises(queue.Empty):
+            with pool.client(timeout=0.05):
+                pass
+    stats = pool.stats()
+    assert stats["in_use"] == 0
+    assert stats["available"] == 2
+    assert stats["peak_in_use"] == 2
+
+def test_waiting_caller_gets_a_returned_client():
+    pool = SpotifyClientPool(SlowAuthManager(), size=1)
+    got = []
+
+    def borrow():
+        with pool.client(timeout=2) as sp:
+            got.append(sp)
+
+    with pool.client() as held:
+        thread = threading.Thread(target=borrow)
+        thread.start()
+        time.sleep(0.1)
+    thread.join()
+    assert got == [held]
+    assert pool.stats()["checkouts"] == 2
+
+def test_client_is_returned_after_an_error():
+    pool = SpotifyClientPool(SlowAuthManager(), size=1)
+    with pytest.raises(RuntimeError):
+        with pool.client():
+            raise RuntimeError("request failed")
+    assert pool.stats()["available"] == 1
+
+def test_sessions_retry_server_errors_but_not_429():
+    pool = SpotifyClientPool(SlowAuthManager(), size=1, connections=3, retries=4)
+    with pool.client() as sp:
+        adapter = sp._session.get_adapter("https://api.spotify.com/v1/")
+    assert adapter.max_retries.total == 4
+    assert 503 in adapter.max_retries.status_forcelist
+    assert 429 not in adapter.max_retries.status_forcelist
+    assert not adapter.max_retries.respect_retry_after_header
+    assert adapter._pool_maxsize == 3
@@ -0,0 +1,66 @@
+import asyncio
+import random
+
+import pytest
+
+import title_generator
+from offline_titles import generate_offline_title, generate_offline_titles
+from resilience import CircuitBreaker, OPEN
+from title_pool import TitlePool
+
+PLAYLIST = {"genres": ["indie rock", "shoegaze"], "mood_descriptor": "melancholic", "style_elements": []}
+
+@pytest.mark.parametrize("mood", [None, "", "rainy night drive", "peaceful"])
+def test_offline_titles_accept_any_mood(mood):
+    titles = generate_offline_titles(PLAYLIST, mood, count=5, rng=random.Random(1))
+    assert len(titles) == 5
+    assert len(set(titles)) == 5
+    assert all(3 <= len(title) <= 50 for title in titles)
+
+def test_offline_title_without_genres():
+    assert generate_offline_title({}, None)
+
+def test_title_signature_ignores_genre_order_and_mood_case():
+    other = {**PLAYLIST, "genres": list(reversed(PLAYLIST["genres"]))}
+    assert title_generator.title_signature(PLAYLIST, "Calm") == title_generator.title_signature(other, "calm ")
+    assert title_generator.title_signature(PLAYLIST, "calm") != title_generator.title_signature(PLAYLIST, "angry")
+
+def test_parse_title_candidates_cleans_and_deduplicates():
+    text = '1. "Quiet Harbor Lights"\n2) Quiet harbor lights\n- Paper Horizons\n\nab\n'
+    response = {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+    assert title_generator.parse_title_candidates(response) == ["Quiet Harbor Lights", "Paper Horizons"]
+    assert title_generator.parse_title_candidates({}) == []
+
+def test_title_pool_hands_out_each_title_once(tmp_path):
+    pool = TitlePool(tmp_path / "titles.sqlite3", ttl=60)
+    pool.add("sig", ["One", "Two"])
+    assert pool.size("sig") == 2
+    assert {pool.take("sig"), pool.take("sig")} == {"One", "Two"}
+    assert pool.take("sig") is None
+    assert pool.take("other") is None
+
+def test_cancelled_trial_call_releases_the_breaker(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0)
+    breaker.record_failure()
+    monkeypatch.setattr(title_generator, "_breaker", breaker)
+
+    async def hang(*args, **kwargs):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(title_generator, "_post_titles_async", hang)
+
+    async def main():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(title_generator.request_titles_async(None, PLAYLIST), 0.1)
+
+    asyncio.run(main())
+    assert breaker.state == OPEN
+    # After the cooldown another trial is allowed
+    assert breaker.allow()
+
+def test_open_breaker_skips_gemini(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=60)
+    breaker.record_failure()
+    monkeypatch.setattr(title_generator, "_breaker", breaker)
+    monkeypatch.setattr(title_generator, "_post_titles", lambda *args: pytest.fail("Gemini was called"))
+    assert title_generator.request_titles(PLAYLIST) == []
@@ -1,69 +1,243 @@
 import requests
 import json
-from config import GEMINI_API_KEY, GEMINI_API_URL
+import hashlib
+import asyncio
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-def generate_title(playlist_data, mood=""):
-    """Generate album title using Gemini API"""
-    if not GEMINI_API_KEY:
-        print("ERROR: Missing Gemini API key. Please set GEMINI_API_KEY in your .env file.")
-        return "New Album"
-    
-    genres = ", ".join(playlist_data.get("genres", ["music"]))
+import aiohttp
+
+from config import (
+    GEMINI_API_KEY, GEMINI_API_URL, TITLE_CANDIDATES, TITLE_TIMEOUT, TITLE_HEDGE_ENABLED,
+    TITLE_HEDGE_MIN_DELAY, TITLE_BREAKER_FAILURES, TITLE_BREAKER_COOLDOWN
+)
+from title_pool import get_title_pool
+from single_flight import get_single_flight
+from resilience import CircuitBreaker, LatencyTracker, hedged_call, hedged_call_async
+from offline_titles import generate_offline_title
+
+# Title used when no title could be generated in time at all
+DEFAULT_TITLE = "New Album"
+
+class TitleRequestError(Exception):
+    """Raised when a Gemini title request fails or returns nothing usable"""
+
+# Shared by every title request of this process
+_breaker = CircuitBreaker(TITLE_BREAKER_FAILURES, TITLE_BREAKER_COOLDOWN)
+_latencies = LatencyTracker()
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="titles")
+
+# Numbering or bullets Gemini may put in front of each candidate
+CANDIDATE_PREFIX = re.compile(r"^\s*(?:\d+[.):]|[-*\u2022])\s*")
+
+def title_inputs(playlist_data, mood=""):
+    """Genres, mood and style elements a title is generated from"""
+    genres = playlist_data.get("genres", ["music"])
     mood_to_use = mood if mood else playlist_data.get("mood_descriptor", "")
-    
     style_elements = playlist_data.get("style_elements", [])
+    return genres, mood_to_use, style_elements
+
+def build_title_request(playlist_data, mood="", count=TITLE_CANDIDATES):
+    """Build the Gemini request URL, headers and body for `count` candidate titles"""
+    genres, _, style_elements = title_inputs(playlist_data, mood)
+    genres = ", ".join(genres)
     style_text = ", ".join(style_elements) if style_elements else ""
     
-    prompt = f"""You are creating a unique, evocative album title. 
-Create a single, short album title (3-5 words) for a {genres} music album. 
+    prompt = f"""You are creating unique, evocative album titles. 
+Create {count} different short album titles (3-5 words each) for a {genres} music album. 
 The album cover has these visual elements: {style_text}. Avoid clichés like 
 'Neon', 'Tokyo', 'Bloom', 'Sakura' or other stereotypical words. This is just 
 an example for the genre j-pop but obviously don't reuse generic titles for other genres too.
-Create a title that is poetic, emotionally resonant, and truly original.
-Create a title that reflects both the music genres and these visual elements.
-Respond with only the title, nothing else."""
+Create titles that are poetic, emotionally resonant, and truly original.
+Create titles that reflect both the music genres and these visual elements.
+Respond with only the titles, one per line, nothing else."""
 
-    try:
-        # Prepare the request to Gemini API
-        headers = {
-            "Content-Type": "application/json",
-        }
-        
-        data = {
-            "contents": [
-                {
-                    "parts": [
-                        {
-                            "text": prompt
-                        }
-                    ]
-                }
-            ],
-            "generationConfig": {
-                "temperature": 0.9,
-                "maxOutputTokens": 20,
-                "topP": 0.8
+    # Prepare the request to Gemini API
+    headers = {
+        "Content-Type": "application/json",
+    }
+    
+    data = {
+        "contents": [
+            {
+                "parts": [
+                    {
+                        "text": prompt
+                    }
+                ]
             }
+        ],
+        "generationConfig": {
+            "temperature": 0.9,
+            "maxOutputTokens": 20 * count,
+            "topP": 0.8
         }
-        
-        # Add API key to URL
-        url = f"{GEMINI_API_URL}?key={GEMINI_API_KEY}"
-        
-        # Make the request
-        response = requests.post(url, headers=headers, json=data)
-        
-        if response.status_code == 200:
-            response_json = response.json()
-            # Extract the title from the response
-            if 'candidates' in response_json and len(response_json['candidates']) > 0:
-                text = response_json['candidates'][0]['content']['parts'][0]['text']
-                # Clean up the title
-                title = text.strip().replace('"', '').replace("'", "")
-                return title[:50] if title and len(title) >= 3 else "New Album"
-        
-        print(f"Error generating title: {response.text}")
-        return "New Album"
-        
+    }
+    
+    # Add API key to URL
+    url = f"{GEMINI_API_URL}?key={GEMINI_API_KEY}"
+    
+    return url, headers, data
+
+def title_signature(playlist_data, mood=""):
+    """Hash of the genres, mood and style a title is generated from"""
+    genres, mood_to_use, style_elements = title_inputs(playlist_data, mood)
+    key = json.dumps([sorted(genres), mood_to_use.strip().lower(), sorted(style_elements)])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+def parse_title_candidates(response_json):
+    """Extract and clean the candidate titles from a Gemini response"""
+    if 'candidates' not in response_json or len(response_json['candidates']) == 0:
+        return []
+    
+    text = response_json['candidates'][0]['content']['parts'][0]['text']
+    titles = []
+    seen = set()
+    for line in text.splitlines():
+        # Clean up the title
+        title = CANDIDATE_PREFIX.sub("", line).strip().replace('"', '').replace("'", "")[:50]
+        if len(title) >= 3 and title.lower() not in seen:
+            seen.add(title.lower())
+            titles.append(title)
+    return titles
+
+def _post_titles(url, headers, data, timeout):
+    """One Gemini request for candidate titles; raises TitleRequestError on failure"""
+    started = time.monotonic()
+    response = requests.post(url, headers=headers, json=data, timeout=timeout)
+    if response.status_code != 200:
+        raise TitleRequestError(f"Gemini returned {response.status_code}: {response.text[:200]}")
+    titles = parse_title_candidates(response.json())
+    if not titles:
+        raise TitleRequestError("Gemini returned no usable titles")
+    _latencies.record(time.monotonic() - started)
+    return titles
+
+async def _post_titles_async(session, url, headers, data, timeout):
+    """One Gemini request for candidate titles on an aiohttp session"""
+    started = time.monotonic()
+    async with session.post(url, headers=headers, json=data, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+        if response.status != 200:
+            raise TitleRequestError(f"Gemini returned {response.status}: {(await response.text())[:200]}")
+        titles = parse_title_candidates(await response.json())
+    if not titles:
+        raise TitleRequestError("Gemini returned no usable titles")
+    _latencies.record(time.monotonic() - started)
+    return titles
+
+def hedge_delay():
+    """Seconds before a second Gemini request is sent, or None if hedging is off"""
+    if not TITLE_HEDGE_ENABLED:
+        return None
+    p95 = _latencies.percentile(95)
+    return max(TITLE_HEDGE_MIN_DELAY, p95) if p95 is not None else TITLE_HEDGE_MIN_DELAY
+
+def request_titles(playlist_data, mood=""):
+    """Ask Gemini for a batch of candidate titles within TITLE_TIMEOUT ([] on failure)"""
+    if not _breaker.allow():
+        return []
+    
+    url, headers, data = build_title_request(playlist_data, mood)
+    try:
+        titles = hedged_call(
+            _executor, lambda timeout: _post_titles(url, headers, data, timeout), TITLE_TIMEOUT, hedge_delay()
+        )
+    except Exception as e:
+        print(f"Error generating title: {e}")
+        _breaker.record_failure()
+        return []
+    
+    _breaker.record_success()
+    return titles
+
+async def request_titles_async(session, playlist_data, mood=""):
+    """Ask Gemini for a batch of candidate titles on an aiohttp session within TITLE_TIMEOUT ([] on failure)"""
+    if not _breaker.allow():
+        return []
+    
+    url, headers, data = build_title_request(playlist_data, mood)
+    succeeded = False
+    try:
+        titles = await hedged_call_async(
+            lambda timeout: _post_titles_async(session, url, headers, data, timeout), TITLE_TIMEOUT, hedge_delay()
+        )
+        succeeded = True
     except Exception as e:
         print(f"Error generating title: {e}")
-        return "New Album"
\ No newline at end of file
+        return []
+    finally:
+        # Also runs when the caller cancels us, so a half-open trial slot is always released
+        if succeeded:
+            _breaker.record_success()
+        else:
+            _breaker.record_failure()
+    
+    return titles
+
+def offline_title(playlist_data, mood=""):
+    """Title built locally when Gemini is unavailable"""
+    title = generate_offline_title(playlist_data, mood)
+    print(f"Gemini unavailable (circuit {_breaker.state}), using offline title")
+    return title
+
+def generate_title(playlist_data, mood=""):
+    """Generate album title, from the title pool or a new batch from Gemini"""
+    if not GEMINI_API_KEY:
+        print("ERROR: Missing Gemini API key. Please set GEMINI_API_KEY in your .env file.")
+        return generate_offline_title(playlist_data, mood)
+    
+    pool = get_title_pool()
+    signature = title_signature(playlist_data, mood)
+    
+    def refill():
+        titles = request_titles(playlist_data, mood)
+        pool.add(signature, titles)
+        return len(titles)
+    
+    # A batch is shared by everyone waiting, so a burst larger than one batch may need a second
+    for attempt in range(2):
+        title = pool.take(signature)
+        if title:
+            return title
+        # Concurrent callers with the same signature wait for one Gemini call
+        refilled = get_single_flight().do(
+            f"titles:{signature}", refill, lookup=lambda started: pool.size(signature) or None
+        )
+        if not refilled:
+            break
+    
+    return pool.take(signature) or offline_title(playlist_data, mood)
+
+async def generate_title_async(session, playlist_data, mood=""):
+    """Generate album title, from the title pool or a new batch from Gemini on an aiohttp session"""
+    if not GEMINI_API_KEY:
+        print("ERROR: Missing Gemini API key. Please set GEMINI_API_KEY in your .env file.")
+        return generate_offline_title(playlist_data, mood)
+    
+    loop = asyncio.get_running_loop()
+    pool = get_title_pool()
+    signature = title_signature(playlist_data, mood)
+    
+    async def refill():
+        titles = await request_titles_async(session, playlist_data, mood)
+        await loop.run_in_executor(None, pool.add, signature, titles)
+        return len(titles)
+    
+    # A batch is shared by everyone waiting, so a burst larger than one batch may need a second
+    for attempt in range(2):
+        title = await loop.run_in_executor(None, pool.take, signature)
+        if title:
+            return title
+        # Concurrent callers with the same signature wait for one Gemini call
+        refilled = await get_single_flight().do_async(
+            f"titles:{signature}", refill, lookup=lambda started: pool.size(signature) or None
+        )
+        if not refilled:
+            break
+    
+    return await loop.run_in_executor(None, pool.take, signature) or offline_title(playlist_data, mood)
+
+def get_title_stats():
+    """Circuit breaker state and recent Gemini latency"""
+    return {**_breaker.stats(), "p95_seconds": _latencies.percentile(95), "hedge_delay": hedge_delay()}
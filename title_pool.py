@@ -0,0 +1,89 @@
+import sqlite3
+import time
+from pathlib import Path
+from config import TITLE_POOL_PATH, TITLE_POOL_TTL
+
+class TitlePool:
+    """Persistent pool of unused candidate titles keyed by title signature
+
+    Gemini returns several candidates per call. The first is used and the
+    rest wait here for the next generation with the same genres, mood and
+    style. Each title is handed out once, and titles older than `ttl`
+    seconds are dropped.
+    """
+
+    def __init__(self, path=TITLE_POOL_PATH, ttl=TITLE_POOL_TTL):
+        self.path = str(path)
+        self.ttl = ttl
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._create_table()
+
+    def _connect(self):
+        """Open a new connection (connections are not shared between threads)"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _create_table(self):
+        """Create the pool table if it does not exist yet"""
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS titles ("
+                "signature TEXT NOT NULL, title TEXT NOT NULL, created_at REAL NOT NULL, "
+                "PRIMARY KEY (signature, title))"
+            )
+        conn.close()
+
+    def take(self, signature):
+        """Remove and return the oldest unused title for a signature, or None"""
+        conn = self._connect()
+        try:
+            # An immediate transaction keeps two processes from taking the same title
+            conn.isolation_level = None
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT title FROM titles WHERE signature = ? AND created_at >= ? "
+                "ORDER BY created_at, rowid LIMIT 1",
+                (signature, time.time() - self.ttl)
+            ).fetchone()
+            if row:
+                conn.execute("DELETE FROM titles WHERE signature = ? AND title = ?", (signature, row[0]))
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return row[0] if row else None
+
+    def add(self, signature, titles):
+        """Store candidate titles and drop expired ones"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO titles (signature, title, created_at) VALUES (?, ?, ?)",
+                    [(signature, title, now) for title in titles]
+                )
+                conn.execute("DELETE FROM titles WHERE created_at < ?", (now - self.ttl,))
+        finally:
+            conn.close()
+
+    def size(self, signature):
+        """Number of unused titles for a signature"""
+        conn = self._connect()
+        try:
+            return conn.execute(
+                "SELECT COUNT(*) FROM titles WHERE signature = ? AND created_at >= ?",
+                (signature, time.time() - self.ttl)
+            ).fetchone()[0]
+        finally:
+            conn.close()
+
+# Shared pool instance, created on first use
+_title_pool = None
+
+def get_title_pool():
+    """Get the shared title pool"""
+    global _title_pool
+    if _title_pool is None:
+        _title_pool = TitlePool()
+    return _title_pool
@@ -7,32 +7,43 @@ import urllib.parse
 from pathlib import Path
 import os
 import requests
-from config import DATA_DIR, LORA_DIR, LORA_CONFIG_PATH
+from config import DATA_DIR, LORA_DIR, LORA_CONFIG_PATH, HISTORY_FORMAT
 from models import LoraModel
+import serialization
 
 def generate_random_string(size=10):
     """Generate a random string of letters and digits."""
     return ''.join(random.choices(string.ascii_letters + string.digits, k=size))
 
 def save_generation_data(data, output_path=None):
-    """Save generation data to JSON file."""
+    """Save generation data to a history file (msgpack or compact JSON, see HISTORY_FORMAT)."""
     try:
-        # Create a unique filename based on timestamp
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_name = "".join(c for c in data.get("item_name", "") if c.isalnum() or c in [' ', '-', '_']).strip()
-        safe_name = safe_name.replace(' ', '_')
-        json_filename = f"{timestamp}_{safe_name}.json"
+        if not output_path:
+            # Create a unique filename based on timestamp
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            safe_name = "".join(c for c in data.get("item_name", "") if c.isalnum() or c in [' ', '-', '_']).strip()
+            safe_name = safe_name.replace(' ', '_')
+            extension = serialization.FORMAT_EXTENSIONS[HISTORY_FORMAT]
+            output_path = DATA_DIR / f"{timestamp}_{safe_name}{extension}"
         
-        with open(DATA_DIR / json_filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        DATA_DIR.mkdir(exist_ok=True)
+        serialization.save(data, output_path)
         
-        print(f"Data saved to {DATA_DIR / json_filename}")
+        print(f"Data saved to {output_path}")
         
-        return str(DATA_DIR / json_filename)
+        return str(output_path)
     except Exception as e:
         print(f"Error saving data: {e}")
         return None
 
+def load_generation_data(path):
+    """Load a history file of any supported format or schema version."""
+    try:
+        return serialization.load(path)
+    except Exception as e:
+        print(f"Error loading data from {path}: {e}")
+        return None
+
 def get_available_loras():
     """Get list of available LoRAs (both local and from links)."""
     loras = []